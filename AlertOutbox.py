@@ -0,0 +1,328 @@
+import sqlite3
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from Metrics import ALERTS_FAILED, ALERTS_SENT
+
+
+class AlertOutbox:
+    """
+    Queue of alert e-mails that are sent by a background worker, so detection never
+    waits on the SMTP server.
+
+    Alerts are stored in a small SQLite spool until they are sent, so a restart or a
+    mail outage does not lose them. Failed sends are retried with exponential backoff.
+
+    Alerts enqueued with a group are merged when they are sent: all due alerts of that
+    group go out as one message built by the group's merger (see AlertCoalescer).
+
+    Args:
+        spool_path (str): SQLite file holding the pending alerts.
+        sender (MailPhotoSender): Used to build and send the messages.
+        base_delay (float): Seconds before the first retry; doubled on every failure.
+        max_delay (float): Upper limit for the retry delay.
+        max_attempts (int): Give up on an alert after this many failures (None retries forever).
+            Given-up alerts stay in the spool marked as failed.
+    """
+
+    def __init__(self, spool_path, sender, base_delay=5.0, max_delay=600.0, max_attempts=None):
+        self.spool_path = spool_path
+        self.sender = sender
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.failed_attempts = 0
+
+        self._db = sqlite3.connect(spool_path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._mergers = {}
+        with self._db_lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created REAL NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    to_email TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    last_error TEXT
+                )""")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS attachments (
+                    alert_id INTEGER NOT NULL REFERENCES alerts(id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    data BLOB NOT NULL
+                )""")
+            # Spools written before alerts could be merged lack these columns
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(alerts)")}
+            for column in ("merge_group", "camera"):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE alerts ADD COLUMN {column} TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS alerts_due ON alerts(status, next_attempt)")
+
+    def enqueue(self, subject, body, to_email, attachments=(), group=None, camera=None, send_at=None):
+        """
+        Stores an alert and returns its id right away; the worker sends it.
+        attachments is a list of (filename, jpeg_bytes). Alerts of the same group are
+        merged when sent; send_at holds the alert back until then.
+        """
+        now = time.time()
+        with self._db_lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO alerts (created, subject, body, to_email, next_attempt, merge_group, camera) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now, subject, body, to_email, now if send_at is None else send_at, group, camera))
+            alert_id = cursor.lastrowid
+            self._db.executemany(
+                "INSERT INTO attachments (alert_id, position, filename, data) VALUES (?, ?, ?, ?)",
+                [(alert_id, i, filename, sqlite3.Binary(data)) for i, (filename, data) in enumerate(attachments)])
+        self._wake.set()
+        return alert_id
+
+    def reschedule(self, group, send_at):
+        """Sets when the unsent alerts of group (not yet tried) go out."""
+        with self._db_lock, self._db:
+            self._db.execute(
+                "UPDATE alerts SET next_attempt = ? WHERE status = 'pending' AND merge_group = ? AND attempts = 0",
+                (send_at, group))
+        self._wake.set()
+
+    def add_merger(self, group, merger):
+        """
+        merger.merge(alerts) turns the due alerts of group (dicts, oldest first) into one
+        (subject, body, attachments); at most merger.max_batch alerts are merged.
+        """
+        self._mergers[group] = merger
+
+    def pending_count(self):
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM alerts WHERE status = 'pending'").fetchone()[0]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._send_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        with self._db_lock:
+            self._db.close()
+
+    def _next_due(self):
+        # The earliest pending alert, with the other due alerts of its group
+        now = time.time()
+        fields = "id, created, subject, body, to_email, attempts, next_attempt, merge_group, camera"
+        with self._db_lock:
+            row = self._db.execute(
+                f"SELECT {fields} FROM alerts WHERE status = 'pending' ORDER BY next_attempt, id LIMIT 1").fetchone()
+            if row is None:
+                return []
+            rows = [row]
+            merger = self._mergers.get(row[7])
+            if merger is not None and row[6] <= now:
+                rows = self._db.execute(
+                    f"SELECT {fields} FROM alerts WHERE status = 'pending' AND merge_group = ? AND next_attempt <= ? "
+                    "ORDER BY created, id LIMIT ?", (row[7], now, merger.max_batch)).fetchall()
+            alerts = []
+            for alert_id, created, subject, body, to_email, attempts, next_attempt, group, camera in rows:
+                attachments = self._db.execute(
+                    "SELECT filename, data FROM attachments WHERE alert_id = ? ORDER BY position", (alert_id,)).fetchall()
+                alerts.append({"id": alert_id, "created": created, "subject": subject, "body": body,
+                               "to_email": to_email, "attempts": attempts, "next_attempt": next_attempt,
+                               "group": group, "camera": camera,
+                               "attachments": [(filename, bytes(data)) for filename, data in attachments]})
+        return alerts
+
+    def _send_loop(self):
+        while not self._stop_event.is_set():
+            alerts = self._next_due()
+            if not alerts:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            wait = alerts[0]["next_attempt"] - time.time()
+            if wait > 0:
+                # Nothing due yet; a new alert wakes us up early
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+
+            merger = self._mergers.get(alerts[0]["group"])
+            if merger is not None:
+                subject, body, attachments = merger.merge(alerts)
+            else:
+                subject, body, attachments = alerts[0]["subject"], alerts[0]["body"], alerts[0]["attachments"]
+            to_email = alerts[0]["to_email"]
+            ids = [alert["id"] for alert in alerts]
+            try:
+                self.sender.send_message(self.sender.build_message(subject, body, to_email, attachments))
+            except Exception as e:
+                for alert in alerts:
+                    self._record_failure(alert["id"], alert["attempts"] + 1, e)
+                continue
+
+            with self._db_lock, self._db:
+                self._db.executemany("DELETE FROM attachments WHERE alert_id = ?", [(i,) for i in ids])
+                self._db.executemany("DELETE FROM alerts WHERE id = ?", [(i,) for i in ids])
+            self.sent += 1
+            ALERTS_SENT.inc()
+            print(f"Alert {', '.join(map(str, ids))} sent to {to_email}.")
+
+    def _record_failure(self, alert_id, attempts, error):
+        self.failed_attempts += 1
+        ALERTS_FAILED.inc()
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        status = "pending"
+        if self.max_attempts is not None and attempts >= self.max_attempts:
+            status = "failed"
+            print(f"Alert {alert_id} failed {attempts} times, giving up: {error}")
+        else:
+            print(f"Alert {alert_id} could not be sent ({error}), retrying in {delay:.1f} s.")
+        with self._db_lock, self._db:
+            self._db.execute(
+                "UPDATE alerts SET attempts = ?, next_attempt = ?, status = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, status, str(error), alert_id))
+
+
+def make_contact_sheet(images, columns=3, thumb_width=320, quality=85):
+    """Tiles several JPEG images into one grid image and returns it as JPEG bytes."""
+    thumbs = []
+    for data in images:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        thumb_height = max(1, int(round(height * thumb_width / width)))
+        thumbs.append(cv2.resize(image, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA))
+    if not thumbs:
+        return None
+
+    columns = min(columns, len(thumbs))
+    rows = -(-len(thumbs) // columns)
+    cell_height = max(thumb.shape[0] for thumb in thumbs)
+    sheet = np.zeros((rows * cell_height, columns * thumb_width, 3), dtype=np.uint8)
+    for i, thumb in enumerate(thumbs):
+        row, column = divmod(i, columns)
+        y, x = row * cell_height, column * thumb_width
+        sheet[y:y + thumb.shape[0], x:x + thumb_width] = thumb
+    ok, buffer = cv2.imencode(".jpg", sheet, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+
+class AlertCoalescer:
+    """
+    Merges alerts that happen close together into one e-mail, so someone walking past
+    several times causes one message instead of many.
+
+    Every event goes to the outbox spool as soon as it is added, so a crash or restart
+    loses nothing; the outbox merges the held events of this coalescer when it sends them.
+    The first event after a quiet window goes out right away. Events following it within
+    window seconds are held and sent together once no new event arrived for window
+    seconds, the first of them has waited max_delay seconds, or max_batch have gathered.
+
+    Args:
+        outbox (AlertOutbox): Spool and sender of the alerts.
+        to_email (str): Recipient of the alerts.
+        window (float): Quiet time that closes a batch. 0 sends every event on its own.
+        max_delay (float): Longest time an event may wait for others.
+        max_batch (int): Largest number of events in one e-mail.
+        contact_sheet (bool): Attach one grid image instead of one image per event.
+        group (str): Name of this coalescer's alerts in the spool.
+    """
+
+    def __init__(self, outbox, to_email, window=30.0, max_delay=120.0, max_batch=6, contact_sheet=False,
+                 group="faces"):
+        self.outbox = outbox
+        self.to_email = to_email
+        self.window = window
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.contact_sheet = contact_sheet
+        self.group = group
+        self.batches_sent = 0
+        self.events_received = 0
+
+        self._lock = threading.Lock()
+        self._last_event = None
+        # First event and size of the batch being held, and when it is due
+        self._batch_start = None
+        self._batch_size = 0
+        self._batch_due = None
+
+    def start(self):
+        """Registers the merging with the outbox; held events left from the last run go out with it."""
+        self.outbox.add_merger(self.group, self)
+        return self
+
+    def add(self, subject, body, image_data, camera=None):
+        """Spools one event. Returns right away; the outbox sends it, merged or on its own."""
+        with self._lock:
+            now = time.time()
+            if self._batch_due is not None and now >= self._batch_due:
+                # The held batch has gone out
+                self._batch_start, self._batch_size, self._batch_due = None, 0, None
+            quiet = self._last_event is None or now - self._last_event >= self.window
+            self._last_event = now
+            self.events_received += 1
+            if self._batch_start is None and quiet:
+                send_at = now
+            else:
+                if self._batch_start is None:
+                    self._batch_start = now
+                self._batch_size += 1
+                send_at = min(now + self.window, self._batch_start + self.max_delay)
+                if self._batch_size >= self.max_batch:
+                    send_at = now
+                self._batch_due = send_at
+            self.outbox.enqueue(subject, body, self.to_email, [("face.jpg", image_data)], group=self.group,
+                                camera=camera, send_at=send_at)
+            if self._batch_due is not None:
+                # The batch's earlier events go out together with this one
+                self.outbox.reschedule(self.group, send_at)
+
+    def merge(self, alerts):
+        """Builds one (subject, body, attachments) from the due alerts of this coalescer."""
+        self.batches_sent += 1
+        if len(alerts) == 1:
+            alert = alerts[0]
+            return alert["subject"], alert["body"], alert["attachments"]
+
+        cameras = sorted({alert["camera"] for alert in alerts if alert["camera"] is not None})
+        if cameras:
+            subject = f"Face detected on camera{'s' if len(cameras) > 1 else ''} {', '.join(cameras)} ({len(alerts)} events)"
+        else:
+            subject = f"{alerts[0]['subject']} ({len(alerts)} events)"
+        lines = [f"{len(alerts)} events between {time.ctime(alerts[0]['created'])} and {time.ctime(alerts[-1]['created'])}:"]
+        for i, alert in enumerate(alerts):
+            where = f" on camera {alert['camera']}" if alert["camera"] is not None else ""
+            lines.append(f"{i + 1}. {time.strftime('%H:%M:%S', time.localtime(alert['created']))}{where} - {alert['subject']}: {alert['body']}")
+        images = [data for alert in alerts for _, data in alert["attachments"]]
+
+        attachments = None
+        if self.contact_sheet:
+            sheet = make_contact_sheet(images)
+            if sheet is not None:
+                attachments = [("faces.jpg", sheet)]
+        if attachments is None:
+            attachments = [(f"face_{i + 1}.jpg", data) for i, data in enumerate(images)]
+        return subject, "\n".join(lines), attachments
+
+    def stop(self):
+        """Sends the held events now instead of waiting for the batch to close."""
+        with self._lock:
+            if self._batch_due is not None:
+                self.outbox.reschedule(self.group, time.time())
+            self._batch_start, self._batch_size, self._batch_due = None, 0, None
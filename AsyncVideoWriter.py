@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from Metrics import stage_timer
+
+_encode_seconds = stage_timer("encode")
+
+
+class VideoWriterError(RuntimeError):
+    """A recording could not be opened or encoded."""
+
+
+class AsyncVideoWriter:
+    """
+    cv2.VideoWriter running on its own thread, so encoding overlaps with capture and
+    detection instead of adding to every frame of the capture loop.
+
+    Has the same write()/release() interface as cv2.VideoWriter. Frames are handed over
+    through a bounded queue; when the encoder falls that far behind, write() waits, so no
+    frame of the recording is lost. The caller must not modify a frame after writing it,
+    unless copy is set: then write() copies it into one of a few recycled buffers.
+
+    If encoding fails (e.g. the disk is full) the encode thread stops and keeps the error;
+    the next write() or release() raises it as a VideoWriterError instead of waiting for
+    the thread forever.
+
+    Args:
+        path (str): Output file.
+        fourcc (int): Codec, e.g. cv2.VideoWriter_fourcc(*'XVID').
+        fps (float): Frame rate stored in the file.
+        frame_size (tuple): (width, height) of the frames.
+        max_queue (int): Frames waiting to be encoded before write() blocks.
+        copy (bool): Copy every frame on write(), for callers that reuse their frame buffers.
+    """
+
+    def __init__(self, path, fourcc, fps, frame_size, max_queue=64, copy=False):
+        self.path = path
+        self.writer = cv2.VideoWriter(path, fourcc, fps, frame_size)
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.frames_written = 0
+        self.encode_seconds = 0.0
+        self.max_backlog = 0
+        self.write_waits = 0
+        self.copy = copy
+        self.error = None
+        # Encoded frames go back here; at most max_queue + 2 are ever in use
+        self._free_buffers = deque(maxlen=max_queue + 2)
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._thread.start()
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    def _encode_loop(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            start = time.perf_counter()
+            try:
+                self.writer.write(frame)
+            except Exception as e:
+                self.error = VideoWriterError(f"Encoding {self.path} failed: {e}")
+                self.error.__cause__ = e
+                break
+            elapsed = time.perf_counter() - start
+            self.encode_seconds += elapsed
+            _encode_seconds.observe(elapsed)
+            if self.copy:
+                self._free_buffers.append(frame)
+            self.frames_written += 1
+
+    def _put(self, item):
+        # Wait for room while the encode thread is still there to make some
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise self.error or VideoWriterError(f"Encoder thread for {self.path} stopped.")
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        if self.copy:
+            buffer = self._free_buffers.pop() if self._free_buffers else None
+            if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+                buffer = frame.copy()
+            else:
+                np.copyto(buffer, frame)
+            frame = buffer
+        try:
+            self.frames.put_nowait(frame)
+        except queue.Full:
+            # Encoder is behind: wait rather than drop a frame of the recording
+            self.write_waits += 1
+            self._put(frame)
+        self.max_backlog = max(self.max_backlog, self.frames.qsize())
+
+    def backlog(self):
+        """Frames waiting to be encoded."""
+        return self.frames.qsize()
+
+    def encode_fps(self):
+        """Frames per second the encoder manages, not counting time spent waiting for frames."""
+        return self.frames_written / self.encode_seconds if self.encode_seconds else 0.0
+
+    def release(self):
+        """Encodes the frames still queued, then closes the file. Raises the encoding error, if any."""
+        if self._thread is not None:
+            # A thread stopped by an error no longer makes room in the queue
+            while self._thread.is_alive():
+                try:
+                    self.frames.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self._thread.join()
+            self._thread = None
+            self.writer.release()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,175 @@
+import time
+
+import cv2
+import numpy as np
+
+from Metrics import stage_timer
+
+_absdiff_seconds = stage_timer("absdiff")
+_threshold_seconds = stage_timer("threshold")
+_subtract_seconds = stage_timer("subtract")
+
+
+class BackgroundModel:
+    """
+    Common interface for the motion background models.
+
+    apply() takes a blurred grayscale frame and returns a binary mask (0 or 255)
+    where 255 marks pixels that differ from the background.
+
+    The models allocate their working buffers once per frame size. The returned mask is
+    one of them and is overwritten by the next apply(), so copy it to keep it.
+    """
+
+    name = "base"
+
+    def apply(self, gray):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class FrameDiffModel(BackgroundModel):
+    """
+    Compares each frame with the one just before it (the original behaviour).
+
+    The previous frame is kept by reference, not copied: the caller must leave it
+    unchanged until the next apply(), e.g. by alternating between two buffers.
+    """
+
+    name = "frame_diff"
+
+    def __init__(self, threshold=20):
+        self.threshold = threshold
+        self.prev_gray = None
+        self._delta = None
+        self._thresh = None
+
+    def apply(self, gray):
+        if self._thresh is None or self._thresh.shape != gray.shape:
+            self._delta = np.empty_like(gray)
+            self._thresh = np.empty_like(gray)
+            self.prev_gray = None
+        if self.prev_gray is None:
+            self.prev_gray = gray
+            self._thresh.fill(0)
+            return self._thresh
+        start = time.perf_counter()
+        cv2.absdiff(self.prev_gray, gray, dst=self._delta)
+        now = time.perf_counter()
+        _absdiff_seconds.observe(now - start)
+        cv2.threshold(self._delta, self.threshold, 255, cv2.THRESH_BINARY, dst=self._thresh)
+        _threshold_seconds.observe(time.perf_counter() - now)
+        self.prev_gray = gray
+        return self._thresh
+
+    def reset(self):
+        self.prev_gray = None
+
+
+class RunningAverageModel(BackgroundModel):
+    """
+    Keeps an exponentially weighted average of past frames and compares each frame
+    with it. The average is updated in place with cv2.accumulateWeighted, so slow
+    movers still stand out and short flickers fade into the background.
+
+    Args:
+        threshold (int): Minimum difference from the background for a pixel to count.
+        alpha (float): How fast the background follows the scene (0-1).
+    """
+
+    name = "running_average"
+
+    def __init__(self, threshold=20, alpha=0.05):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.background = None
+        self._background_u8 = None
+        self._delta = None
+        self._thresh = None
+
+    def apply(self, gray):
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self._background_u8 = gray.copy()
+            self._delta = np.empty_like(gray)
+            self._thresh = np.zeros_like(gray)
+            return self._thresh
+        start = time.perf_counter()
+        cv2.convertScaleAbs(self.background, dst=self._background_u8)
+        cv2.absdiff(self._background_u8, gray, dst=self._delta)
+        now = time.perf_counter()
+        _absdiff_seconds.observe(now - start)
+        cv2.threshold(self._delta, self.threshold, 255, cv2.THRESH_BINARY, dst=self._thresh)
+        _threshold_seconds.observe(time.perf_counter() - now)
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        return self._thresh
+
+    def reset(self):
+        self.background = None
+        self._background_u8 = None
+
+
+class SubtractorModel(BackgroundModel):
+    """
+    Wraps OpenCV's MOG2 or KNN background subtractor.
+
+    Args:
+        kind (str): "mog2" or "knn".
+        history (int): Number of frames the subtractor learns from.
+        detect_shadows (bool): Shadows are marked separately and never count as motion.
+        warmup_frames (int): Frames used only for learning before any motion is reported.
+    """
+
+    def __init__(self, kind="mog2", history=500, detect_shadows=True, warmup_frames=10):
+        self.kind = kind.lower()
+        self.history = history
+        self.detect_shadows = detect_shadows
+        self.warmup_frames = warmup_frames
+        self.frames_seen = 0
+        self.name = self.kind
+        self.subtractor = None
+        self._fg_mask = None
+        self._thresh = None
+        self.reset()
+
+    def apply(self, gray):
+        if self._thresh is None or self._thresh.shape != gray.shape:
+            self._fg_mask = np.empty_like(gray)
+            self._thresh = np.empty_like(gray)
+        start = time.perf_counter()
+        self.subtractor.apply(gray, fgmask=self._fg_mask)
+        _subtract_seconds.observe(time.perf_counter() - start)
+        self.frames_seen += 1
+        if self.frames_seen <= self.warmup_frames:
+            # The model is still learning and marks most of the frame as foreground
+            self._thresh.fill(0)
+            return self._thresh
+        # Foreground is 255, shadows are 127 - keep only real foreground
+        start = time.perf_counter()
+        cv2.threshold(self._fg_mask, 254, 255, cv2.THRESH_BINARY, dst=self._thresh)
+        _threshold_seconds.observe(time.perf_counter() - start)
+        return self._thresh
+
+    def reset(self):
+        self.frames_seen = 0
+        if self.kind == "mog2":
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=self.history, detectShadows=self.detect_shadows)
+        elif self.kind == "knn":
+            self.subtractor = cv2.createBackgroundSubtractorKNN(history=self.history, detectShadows=self.detect_shadows)
+        else:
+            raise ValueError(f"Unknown background subtractor: {self.kind}. Use 'mog2' or 'knn'.")
+
+
+def create_background_model(name="frame_diff", threshold=20):
+    """Builds a background model by name: frame_diff, running_average, mog2 or knn."""
+    if isinstance(name, BackgroundModel):
+        return name
+    if name == "frame_diff":
+        return FrameDiffModel(threshold)
+    if name == "running_average":
+        return RunningAverageModel(threshold)
+    if name in ("mog2", "knn"):
+        return SubtractorModel(name)
+    raise ValueError(f"Unknown background model: {name}")
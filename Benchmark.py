@@ -0,0 +1,523 @@
+"""
+Measures the stages of the pipeline on the sample clips and on generated clips.
+
+    python Benchmark.py                         # 480p, 1080p and 4K plus recording.avi/output.avi
+    python Benchmark.py --resolutions 480p --stages motion,encode
+    python Benchmark.py --baseline results_old.json
+    python Benchmark.py --import-only --import-budget-ms 50
+
+Every stage runs in a fresh process, so the reported peak RSS belongs to that stage.
+Results are written as JSON (see --output) and can be compared with an earlier run.
+The time to import MainProgram is checked against a budget with python -X importtime;
+the exit code is 1 when it is over budget.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from AsyncVideoWriter import AsyncVideoWriter
+from BackgroundModel import create_background_model
+from FaceDetection import get_detector_pool, scan_video
+from MailPhotoSender import MailPhotoSender, encode_image
+from MailSessionPool import MailSessionPool
+from MainProgram import capture_frame_from_video
+from MotionDetection import DetectionScaler
+from MotionRecorder import MotionRecorder
+from MotionZones import TileMotionMap
+from SmtpStub import SmtpStub
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+SAMPLE_CLIPS = ("recording.avi", "output.avi")
+# Modules that importing MainProgram must not load: they belong to the daemon's startup
+HEAVY_MODULES = ("cv2", "numpy", "dotenv")
+
+STAGES = ("decode", "motion", "motion_alloc", "face", "snapshot", "encode", "encode_async", "mail")
+
+FACE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "face.jpg")
+
+
+def _peak_rss_mb():
+    # ru_maxrss survives exec on Linux, so a spawned process would report the parent's
+    # peak; VmHWM belongs to this process image only
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _summary(latencies, seconds=None, items=None):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    count = len(latencies) if items is None else items
+    seconds = float(latencies.sum()) if seconds is None else seconds
+    return {
+        "frames": count,
+        "seconds": round(seconds, 4),
+        "fps": round(count / seconds, 2) if seconds else None,
+        "p50_ms": round(1000 * float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        "p99_ms": round(1000 * float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+    }
+
+
+def make_synthetic_clip(path, size, frames=60, fps=20.0):
+    """
+    Writes a clip of a still, noisy scene that a face-sized patch walks across halfway
+    through, so both the idle and the motion path of the detector are exercised.
+    """
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    patch_size = max(24, height // 4)
+    patch = cv2.imread(FACE_IMAGE) if os.path.exists(FACE_IMAGE) else None
+    if patch is None:
+        patch = np.full((patch_size, patch_size, 3), 200, dtype=np.uint8)
+    patch = cv2.resize(patch, (patch_size, patch_size), interpolation=cv2.INTER_AREA)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'XVID'), fps, size)
+    moving_from = frames // 2
+    for i in range(frames):
+        frame = background.copy()
+        if i >= moving_from:
+            x = int((i - moving_from) / max(1, frames - moving_from) * (width - patch_size))
+            y = (height - patch_size) // 2
+            frame[y:y + patch_size, x:x + patch_size] = patch
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def iter_frames(video_path, limit=None):
+    """Decodes the clip frame by frame, so long clips are never held in memory at once."""
+    cap = cv2.VideoCapture(video_path)
+    count = 0
+    while limit is None or count < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        count += 1
+        yield frame
+    cap.release()
+
+
+# ---- Stages ----
+# Each one takes the clip path and the options and returns a summary dict
+
+def bench_decode(video_path, options):
+    cap = cv2.VideoCapture(video_path)
+    latencies = []
+    while True:
+        start = time.perf_counter()
+        ret, _ = cap.read()
+        if not ret:
+            break
+        latencies.append(time.perf_counter() - start)
+    cap.release()
+    return _summary(latencies)
+
+
+def bench_motion(video_path, options):
+    # MotionRecorder.record_event over the whole clip, recording its events to a scratch file.
+    # Every frame is analysed (no idle sampling, no dropped frames); a frame's latency is the
+    # time record_event spends on it between two reads
+    recorder = MotionRecorder(source=video_path, output_path=os.path.join(options["work_dir"], "motion.avi"),
+                              drop_policy="block", detection_scale=options["detection_scale"],
+                              background_model=options["background_model"], idle_fps=None)
+    latencies = []
+    events = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not recorder.open():
+            raise RuntimeError(f"Cannot open {video_path}")
+        read = recorder.grabber.read
+        last_read = None
+
+        def timed_read(*args, **kwargs):
+            nonlocal last_read
+            if last_read is not None:
+                latencies.append(time.perf_counter() - last_read)
+            result = read(*args, **kwargs)
+            last_read = time.perf_counter()
+            return result
+
+        recorder.grabber.read = timed_read
+        try:
+            while not recorder.camera_ended():
+                if not recorder.record_event():
+                    break
+                events += 1
+        finally:
+            recorder.close()
+    result = _summary(latencies)
+    result["events"] = events
+    return result
+
+
+def _original_motion_step(cap, state):
+    # The motion loop as record_on_motion first had it: new arrays for every step
+    ret, frame = cap.read()
+    if not ret:
+        return False
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (21, 21), 0)
+    if state.get("prev") is not None:
+        frame_delta = cv2.absdiff(state["prev"], gray)
+        thresh = cv2.threshold(frame_delta, 20, 255, cv2.THRESH_BINARY)[1]
+        np.count_nonzero(thresh)
+    state["prev"] = gray
+    return True
+
+
+def _preallocated_motion_step(cap, state):
+    # What MotionRecorder does now: recycled frame, dst= outputs, swapped detection buffers
+    ret, frame = cap.read(image=state["frame"])
+    if not ret:
+        return False
+    state["frame"] = frame
+    gray = state["scaler"].prepare(frame, dst=state["buffers"][state["current"]])
+    state["current"] ^= 1
+    state["tiles"].apply(state["model"].apply(gray))
+    return True
+
+
+def bench_motion_alloc(video_path, options):
+    """
+    Memory allocated per frame by the motion loop, traced with tracemalloc: the original
+    code against the preallocated buffers. The figure per frame is the peak of memory
+    allocated while processing it, i.e. the temporary arrays it needed.
+    """
+    result = {}
+    for name, step in (("original", _original_motion_step), ("preallocated", _preallocated_motion_step)):
+        cap = cv2.VideoCapture(video_path)
+        ret, frame = cap.read()
+        scaler = DetectionScaler(frame.shape, "full")
+        state = {"frame": frame, "scaler": scaler, "model": create_background_model("frame_diff", 20),
+                 "buffers": [scaler.empty_output(), scaler.empty_output()], "current": 0,
+                 "tiles": TileMotionMap(scaler, 5000)}
+        # Warm up, so buffers allocated once per resolution are not counted
+        for _ in range(2):
+            step(cap, state)
+
+        tracemalloc.start()
+        allocated = []
+        latencies = []
+        while len(allocated) < options["alloc_frames"]:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            if not step(cap, state):
+                break
+            latencies.append(time.perf_counter() - start)
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        cap.release()
+
+        summary = _summary(latencies)
+        summary["allocated_kb_per_frame"] = round(float(np.mean(allocated)) / 1e3, 1) if allocated else None
+        summary["frame_kb"] = round(frame.nbytes / 1e3, 1)
+        result[name] = summary
+    combined = dict(result["preallocated"])
+    combined["original"] = result["original"]
+    return combined
+
+
+def bench_face(video_path, options):
+    # Per-frame cost of a full-frame cascade scan, as in FaceScanWorker
+    frames = iter_frames(video_path, options["face_frames"])
+    detector = get_detector_pool().get()
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        detector.detectMultiScale3(gray, scaleFactor=1.1, minNeighbors=5)
+        latencies.append(time.perf_counter() - start)
+    result = _summary(latencies)
+
+    # What faceDetect does on a saved clip: scan until the first face
+    start = time.perf_counter()
+    scan = scan_video(video_path)
+    result["scan_video_seconds"] = round(time.perf_counter() - start, 4)
+    result["scan_video_frames"] = scan["frames_scanned"]
+    result["face_found"] = scan["face_found"]
+    return result
+
+
+def bench_snapshot(video_path, options):
+    # capture_frame_from_video: open the clip, read the first frame, save it as JPEG
+    output = os.path.join(options["work_dir"], "snapshot.jpg")
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(options["repeats"]):
+            start = time.perf_counter()
+            capture_frame_from_video(video_path, output)
+            latencies.append(time.perf_counter() - start)
+    return _summary(latencies)
+
+
+def bench_encode(video_path, options):
+    frames = iter_frames(video_path)
+    first = next(frames)
+    height, width = first.shape[:2]
+    writer = cv2.VideoWriter(os.path.join(options["work_dir"], "encode.avi"), cv2.VideoWriter_fourcc(*'XVID'),
+                             20.0, (width, height))
+    latencies = []
+    for frame in itertools.chain([first], frames):
+        start = time.perf_counter()
+        writer.write(frame)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    writer.release()
+    return _summary(latencies, seconds=sum(latencies) + time.perf_counter() - start)
+
+
+def bench_encode_async(video_path, options):
+    # Latencies are what the capture loop waits for; fps counts until the file is complete
+    frames = iter_frames(video_path)
+    first = next(frames)
+    height, width = first.shape[:2]
+    writer = AsyncVideoWriter(os.path.join(options["work_dir"], "encode_async.avi"), cv2.VideoWriter_fourcc(*'XVID'),
+                              20.0, (width, height))
+    latencies = []
+    for frame in itertools.chain([first], frames):
+        start = time.perf_counter()
+        writer.write(frame)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    writer.release()
+    result = _summary(latencies, seconds=sum(latencies) + time.perf_counter() - start)
+    result["max_backlog"] = writer.max_backlog
+    return result
+
+
+def bench_mail(video_path, options):
+    # Encode one frame of the clip and send it repeatedly to the local stub
+    frame = next(iter_frames(video_path, 1))
+    stub = SmtpStub().start()
+    results = {}
+    try:
+        for name, max_idle in (("pooled", 240.0), ("connect_per_message", 0.0)):
+            pool = MailSessionPool("127.0.0.1", stub.port, "bench@localhost", "", use_tls=False, max_idle=max_idle)
+            sender = MailPhotoSender("bench@localhost", "", "127.0.0.1", stub.port, pool=pool)
+            latencies = []
+            for _ in range(options["mail_messages"]):
+                start = time.perf_counter()
+                image_data = encode_image(frame, max_bytes=200_000)
+                msg = sender.build_message("Benchmark", "Benchmark message.", "bench@localhost", [("face.jpg", image_data)])
+                sender.send_message(msg)
+                latencies.append(time.perf_counter() - start)
+            pool.close()
+            summary = _summary(latencies)
+            summary["connects"] = pool.connects
+            results[name] = summary
+    finally:
+        stub.stop()
+    result = dict(results["pooled"])
+    result["connect_per_message"] = results["connect_per_message"]
+    return result
+
+
+BENCHMARKS = {
+    "decode": bench_decode,
+    "motion": bench_motion,
+    "motion_alloc": bench_motion_alloc,
+    "face": bench_face,
+    "snapshot": bench_snapshot,
+    "encode": bench_encode,
+    "encode_async": bench_encode_async,
+    "mail": bench_mail,
+}
+
+
+def _run_stage(stage, video_path, options):
+    # Runs in a fresh process; the peak RSS before the stage is the interpreter and OpenCV
+    rss_before = _peak_rss_mb()
+    result = BENCHMARKS[stage](video_path, options)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["rss_before_mb"] = rss_before
+    return result
+
+
+def run_benchmarks(clips, stages, options):
+    """clips maps a name to a video path. Returns one result dict per (clip, stage)."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for clip_name, video_path in clips.items():
+        cap = cv2.VideoCapture(video_path)
+        size = f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}"
+        cap.release()
+        for stage in stages:
+            if stage == "mail" and clip_name != next(iter(clips)):
+                continue  # The mail path does not depend on the clip, measure it once
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(_run_stage, stage, video_path, options).result()
+            result.update(clip=clip_name, size=size, stage=stage)
+            results.append(result)
+            print(f"{clip_name:>16} {size:>9} {stage:>13}: {result['fps'] or 0:9.1f} fps  "
+                  f"p50 {result['p50_ms'] or 0:8.2f} ms  p99 {result['p99_ms'] or 0:8.2f} ms  "
+                  f"peak RSS {result['peak_rss_mb'] or 0:7.1f} MB")
+            if "allocated_kb_per_frame" in result:
+                print(f"{'':>41}allocated per frame: {result['original']['allocated_kb_per_frame']} kB before, "
+                      f"{result['allocated_kb_per_frame']} kB now (frame {result['frame_kb']} kB)")
+    return results
+
+
+def compare(results, baseline_path):
+    """Prints the fps change of every (clip, stage) against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["clip"], r["stage"]): r for r in json.load(f)["results"]}
+    for result in results:
+        old = baseline.get((result["clip"], result["stage"]))
+        if old is None or not old.get("fps") or not result.get("fps"):
+            continue
+        change = result["fps"] / old["fps"] - 1
+        print(f"{result['clip']:>16} {result['stage']:>13}: {old['fps']:9.1f} -> {result['fps']:9.1f} fps ({change:+.0%})")
+
+
+def measure_import_time(module="MainProgram", repeats=5):
+    """
+    Cumulative import time of module in a fresh interpreter, from python -X importtime.
+    The best of repeats runs is kept, so the first run compiling the bytecode doesn't count.
+    Also returns the slowest imports it pulled in and which HEAVY_MODULES were loaded.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeats):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=here, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+        # import time: self [us] | cumulative | imported package, indented two spaces per
+        # nesting level; a package's own imports are listed right before it
+        lines = []
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                lines.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+        for index, (depth, name, cumulative) in enumerate(lines):
+            if name != module:
+                continue
+            imports = {}
+            for child_depth, child, child_cumulative in reversed(lines[:index]):
+                if child_depth <= depth:
+                    break
+                imports[child] = child_cumulative
+            if best is None or cumulative < best[0]:
+                best = (cumulative, imports)
+    total, imports = best
+    slowest = sorted(imports.items(), key=lambda item: -item[1])[:5]
+    return {
+        "module": module,
+        "import_ms": round(total / 1000, 2),
+        "slowest": [{"module": name, "ms": round(us / 1000, 2)} for name, us in slowest],
+        "heavy_modules": [name for name in HEAVY_MODULES if name in imports],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the motion, face, encode and mail stages.")
+    parser.add_argument("--resolutions", default="480p,1080p,4k",
+                        help=f"Generated clips, comma-separated from {', '.join(RESOLUTIONS)} (empty for none).")
+    parser.add_argument("--frames", type=int, default=60, help="Frames per generated clip.")
+    parser.add_argument("--no-samples", action="store_true", help="Skip recording.avi and output.avi.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run.")
+    parser.add_argument("--face-frames", type=int, default=20, help="Frames per clip for the face stage.")
+    parser.add_argument("--alloc-frames", type=int, default=30, help="Frames traced by the motion_alloc stage.")
+    parser.add_argument("--repeats", type=int, default=10, help="Repetitions of the snapshot stage.")
+    parser.add_argument("--mail-messages", type=int, default=20, help="Messages sent per mail variant.")
+    parser.add_argument("--detection-scale", default="full", help="Motion detection scale (full, half, quarter).")
+    parser.add_argument("--background-model", default="frame_diff", help="Motion background model.")
+    parser.add_argument("--output", help="JSON result file (default: benchmark_<time>.json).")
+    parser.add_argument("--baseline", help="Earlier JSON result file to compare with.")
+    parser.add_argument("--import-budget-ms", type=float, default=50.0,
+                        help="Most milliseconds importing MainProgram may take.")
+    parser.add_argument("--import-only", action="store_true", help="Only check the import time.")
+    args = parser.parse_args(argv)
+
+    import_result = measure_import_time()
+    over_budget = import_result["import_ms"] > args.import_budget_ms or import_result["heavy_modules"]
+    slowest = ", ".join(f"{item['module']} {item['ms']} ms" for item in import_result["slowest"])
+    print(f"import MainProgram: {import_result['import_ms']} ms (budget {args.import_budget_ms:g} ms; {slowest})")
+    if import_result["heavy_modules"]:
+        print(f"import MainProgram loads {', '.join(import_result['heavy_modules'])}")
+    if args.import_only:
+        return 1 if over_budget else 0
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+    work_dir = os.path.join(tempfile.gettempdir(), "camera_benchmark")
+    os.makedirs(work_dir, exist_ok=True)
+    clips = {}
+    for name in [r for r in args.resolutions.split(",") if r]:
+        if name not in RESOLUTIONS:
+            parser.error(f"Unknown resolution: {name}")
+        path = os.path.join(work_dir, f"synthetic_{name}_{args.frames}.avi")
+        if not os.path.exists(path):
+            print(f"Generating {name} clip ({args.frames} frames)...")
+            make_synthetic_clip(path, RESOLUTIONS[name], args.frames)
+        clips[f"synthetic_{name}"] = path
+    if not args.no_samples:
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in SAMPLE_CLIPS:
+            path = os.path.join(here, name)
+            if os.path.exists(path):
+                clips[name] = path
+    if not clips:
+        parser.error("No clips to benchmark.")
+
+    options = {"work_dir": work_dir, "face_frames": args.face_frames, "alloc_frames": args.alloc_frames,
+               "repeats": args.repeats,
+               "mail_messages": args.mail_messages, "detection_scale": args.detection_scale,
+               "background_model": args.background_model}
+    results = run_benchmarks(clips, stages, options)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "options": {k: v for k, v in options.items() if k != "work_dir"},
+        "import": import_result,
+        "results": results,
+    }
+    output = args.output or f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+# Processes are spawned, not forked, so a worker never inherits the parent's threads,
+# open SMTP sessions or SQLite connections
+_mp = multiprocessing.get_context("spawn")
+
+
+def parse_source(text):
+    """Turns "0" into the device index 0; files and stream URLs are returned unchanged."""
+    text = text.strip()
+    return int(text) if text.isdigit() else text
+
+
+def _camera_worker(name, source, options, clip_index_path, alert_max_bytes, armed, stop_event, events, stats_interval):
+    # Runs in its own process: one camera, its own detector and writer threads
+    from ClipIndex import ClipIndex
+    from FaceDetection import FaceScanWorker
+    from MailPhotoSender import encode_image
+    from Metrics import REGISTRY
+    from MotionRecorder import MotionRecorder
+
+    clip_index = ClipIndex(clip_index_path) if clip_index_path else None
+    recorder = MotionRecorder(source=source, clip_index=clip_index, camera_name=name, **options)
+    if not recorder.open():
+        events.put(("failed", name, "camera could not be opened"))
+        return
+    events.put(("started", name, os.getpid()))
+
+    # Set whenever the worker should stop waiting for motion: disarmed or shutting down
+    idle = threading.Event()
+    done = threading.Event()
+
+    def report_stats():
+        # The stage timings and counters of this process go along, for the supervisor's /metrics
+        events.put(("stats", name, dict(recorder.stats(), metrics=REGISTRY.collect())))
+
+    def control_loop():
+        # The shared events are only polled: a process that exits while blocked in
+        # multiprocessing.Event.wait() leaves the event unusable for everyone else
+        last_stats = 0.0
+        while not done.is_set():
+            if stop_event.is_set() or not armed.is_set():
+                idle.set()
+            else:
+                idle.clear()
+            if time.time() - last_stats >= stats_interval:
+                report_stats()
+                last_stats = time.time()
+            done.wait(0.2)
+
+    control = threading.Thread(target=control_loop, daemon=True)
+    control.start()
+
+    paused = False
+    while not stop_event.is_set():
+        if idle.is_set():
+            if not paused:
+                recorder.pause()
+                paused = True
+            time.sleep(0.2)
+            continue
+        if paused:
+            recorder.resume()
+            paused = False
+
+        face_worker = FaceScanWorker().start()
+        recorded = recorder.record_event(face_worker=face_worker, stop_event=idle)
+        face_found = face_worker.finish()
+        if recorded:
+            events.put(("event", name, face_found))
+        if recorded and face_found:
+            # Cropped to the face and encoded here, so only the small JPEG crosses the process boundary
+            image_data = encode_image(face_worker.face_frame, max_bytes=alert_max_bytes, face_box=face_worker.face_box)
+            events.put(("alert", name, image_data))
+        if not recorded and recorder.camera_ended():
+            # The camera stopped delivering frames; the supervisor starts a new worker
+            events.put(("failed", name, "camera stopped delivering frames"))
+            break
+
+    done.set()
+    control.join()
+    report_stats()
+    recorder.close()
+    if clip_index is not None:
+        clip_index.close()
+
+
+class CameraSupervisor:
+    """
+    Runs one isolated worker process per camera and keeps them running.
+
+    Each worker opens its source, records motion events with a MotionRecorder and scans
+    them for faces. A worker that crashes or loses its camera is started again after a
+    delay that doubles with every quick failure. Workers report their counters and face
+    alerts over one queue; alerts are handed to on_alert in this process, so all cameras
+    share the same outbox. Each worker's stage timings and counters come along with its
+    counters and are served by metrics() with a camera label.
+
+    Args:
+        sources (list or dict): Camera indices, video files or stream URLs. A dict maps
+            camera names to sources; a list names them cam0, cam1, ...
+        recorder_options (dict): Extra MotionRecorder arguments for every camera.
+        segment_dir (str): Clips of each camera go to a subfolder named after it.
+        clip_index_path (str): SQLite clip index shared by all cameras.
+        on_alert (callable): on_alert(name, image_data) is called for each event with a face.
+        alert_max_bytes (int): Size budget of the alert picture.
+        restart_delay (float): Seconds before a failed worker is restarted.
+        max_restart_delay (float): Upper limit for the restart delay.
+        stable_after (float): A worker running this long resets the restart delay.
+        stats_interval (float): Seconds between counter reports of a worker.
+    """
+
+    def __init__(self, sources, recorder_options=None, segment_dir=None, clip_index_path=None, on_alert=None,
+                 alert_max_bytes=200_000, restart_delay=2.0, max_restart_delay=60.0, stable_after=60.0,
+                 stats_interval=10.0):
+        if not isinstance(sources, dict):
+            sources = {f"cam{i}": source for i, source in enumerate(sources)}
+        self.sources = sources
+        self.recorder_options = dict(recorder_options or {})
+        self.segment_dir = segment_dir
+        self.clip_index_path = clip_index_path
+        self.on_alert = on_alert
+        self.alert_max_bytes = alert_max_bytes
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.stats_interval = stats_interval
+
+        self.armed = _mp.Event()
+        self._stop_event = _mp.Event()
+        self._events = _mp.Queue()
+        self._workers = {}
+        self._stats_lock = threading.Lock()
+        # Latest MetricsRegistry.collect() of every worker
+        self._worker_metrics = {}
+        self._stats = {name: {"source": source, "state": "stopped", "pid": None, "restarts": 0, "events": 0,
+                              "face_events": 0, "alerts": 0, "last_error": None,
+                              "frames_captured": 0, "frames_dropped": 0, "backlog": 0}
+                       for name, source in sources.items()}
+        self._thread = None
+
+    def _options_for(self, name):
+        options = dict(self.recorder_options)
+        if self.segment_dir is not None:
+            options["segment_dir"] = os.path.join(self.segment_dir, name)
+        return options
+
+    def _spawn(self, name):
+        process = _mp.Process(
+            target=_camera_worker,
+            args=(name, self.sources[name], self._options_for(name), self.clip_index_path, self.alert_max_bytes,
+                  self.armed, self._stop_event, self._events, self.stats_interval),
+            name=f"camera-{name}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[name] = {"process": process, "started": time.time(), "failures": 0, "restart_at": None}
+        with self._stats_lock:
+            self._stats[name].update(state="starting", pid=process.pid)
+
+    def start(self, armed=True):
+        if armed:
+            self.armed.set()
+        for name in self.sources:
+            self._spawn(name)
+        self._thread = threading.Thread(target=self._supervise_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def arm(self):
+        """Workers start watching for motion (again)."""
+        self.armed.set()
+
+    def disarm(self):
+        """Workers stop reading frames but keep their cameras open."""
+        self.armed.clear()
+
+    def _handle(self, kind, name, payload):
+        with self._stats_lock:
+            stats = self._stats[name]
+            if kind == "started":
+                stats.update(state="running", pid=payload)
+            elif kind == "stats":
+                # Counters of the current worker process; events are counted here across restarts
+                stats.update(frames_captured=payload["frames_captured"], frames_dropped=payload["frames_dropped"],
+                             backlog=payload["backlog"])
+                if "metrics" in payload:
+                    self._worker_metrics[name] = payload["metrics"]
+            elif kind == "event":
+                stats["events"] += 1
+                stats["face_events"] += int(payload)
+            elif kind == "failed":
+                stats.update(state="failed", last_error=payload)
+            elif kind == "alert":
+                stats["alerts"] += 1
+        if kind == "alert" and self.on_alert is not None:
+            self.on_alert(name, payload)
+
+    def _check_workers(self):
+        now = time.time()
+        for name, worker in self._workers.items():
+            process = worker["process"]
+            if worker["restart_at"] is not None:
+                if now >= worker["restart_at"]:
+                    failures = worker["failures"]
+                    self._spawn(name)
+                    self._workers[name]["failures"] = failures
+                continue
+            if process.is_alive():
+                continue
+            # Worker exited or crashed: restart it, backing off if it keeps failing quickly
+            process.join()
+            if now - worker["started"] >= self.stable_after:
+                worker["failures"] = 0
+            delay = min(self.restart_delay * 2 ** worker["failures"], self.max_restart_delay)
+            worker["failures"] += 1
+            worker["restart_at"] = now + delay
+            with self._stats_lock:
+                stats = self._stats[name]
+                stats["restarts"] += 1
+                stats.update(state="restarting", pid=None)
+                if process.exitcode:
+                    stats["last_error"] = f"worker exited with code {process.exitcode}"
+            print(f"Camera {name}: worker stopped, restarting in {delay:.1f} seconds.")
+
+    def _supervise_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self._handle(*self._events.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            self._check_workers()
+
+    def stats(self):
+        """Latest counters of every camera, keyed by camera name."""
+        with self._stats_lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def metrics(self):
+        """
+        Per-camera samples for MetricsRegistry.add_collector: the supervisor's own view of the
+        workers, and the stage timings and counters each worker reported, labelled with its
+        camera. The latter come from the current worker process, so they start over after a
+        restart (a counter reset to Prometheus).
+        """
+        stats = self.stats()
+        with self._stats_lock:
+            worker_metrics = dict(self._worker_metrics)
+
+        def samples(key):
+            return [("", {"camera": name}, camera[key]) for name, camera in stats.items()]
+
+        families = [
+            ("camera_worker_up", "gauge", "1 while the camera's worker process is running.",
+             [("", {"camera": name}, int(camera["state"] == "running")) for name, camera in stats.items()]),
+            ("camera_worker_restarts_total", "counter", "Worker processes restarted.", samples("restarts")),
+            ("camera_worker_events_total", "counter", "Motion events recorded per camera.", samples("events")),
+            ("camera_worker_face_events_total", "counter", "Events with a face per camera.", samples("face_events")),
+            ("camera_worker_alerts_total", "counter", "Face alerts handed to the outbox per camera.", samples("alerts")),
+            # Reported by the current worker process, so they start over after a restart
+            ("camera_worker_frames_captured", "gauge", "Frames read by the current worker.", samples("frames_captured")),
+            ("camera_worker_frames_dropped", "gauge", "Frames dropped by the current worker.", samples("frames_dropped")),
+            ("camera_worker_backlog", "gauge", "Frames waiting in the worker's capture queue.", samples("backlog")),
+        ]
+        for name, collected in worker_metrics.items():
+            for metric, type_name, help_text, metric_samples in collected:
+                families.append((metric, type_name, help_text,
+                                 [(suffix, {"camera": name, **labels}, value) for suffix, labels, value in metric_samples]))
+        return families
+
+    def stop(self, timeout=10.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        # Keep reading while the workers shut down: they cannot exit before their last
+        # alerts and counters are out of the pipe
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                self._handle(*self._events.get(timeout=0.1))
+            except queue.Empty:
+                if not any(worker["process"].is_alive() for worker in self._workers.values()):
+                    break
+        for name, worker in self._workers.items():
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+            with self._stats_lock:
+                self._stats[name].update(state="stopped", pid=None)
@@ -0,0 +1,53 @@
+class CaptureScheduler:
+    """
+    Decides which camera frames are decoded and analysed.
+
+    While the scene is idle only idle_fps frames per second are decoded; the frames in
+    between are grabbed and thrown away undecoded, which keeps the camera's buffer fresh
+    for almost no CPU. As soon as the motion score reaches pre_trigger (a fraction of the
+    motion threshold, so before a recording is even triggered) every frame is decoded,
+    and the scheduler stays at full rate until the score has stayed below pre_trigger for
+    hysteresis seconds.
+
+    Args:
+        idle_fps (float): Frames per second analysed while idle.
+        pre_trigger (float): Motion score (changed pixels / motion threshold) that switches to full rate.
+        hysteresis (float): Seconds without activity before going back to the idle rate.
+    """
+
+    def __init__(self, idle_fps=2.0, pre_trigger=0.5, hysteresis=5.0):
+        if idle_fps <= 0:
+            raise ValueError("idle_fps must be positive.")
+        self.idle_fps = idle_fps
+        self.pre_trigger = pre_trigger
+        self.hysteresis = hysteresis
+        self.active = False
+        self.switches = 0
+        self._last_active = None
+        self._next_sample = 0.0
+
+    def due(self, now):
+        """True if the frame arriving now should be decoded."""
+        if self.active or now >= self._next_sample:
+            if not self.active:
+                self._next_sample = now + 1.0 / self.idle_fps
+            return True
+        return False
+
+    def update(self, motion_score, now, recording=False):
+        """Feeds the motion score of an analysed frame. While recording the rate stays full."""
+        if recording or motion_score >= self.pre_trigger:
+            self._last_active = now
+            if not self.active:
+                self.active = True
+                self.switches += 1
+        elif self.active and now - self._last_active > self.hysteresis:
+            self.active = False
+            self.switches += 1
+            self._next_sample = now + 1.0 / self.idle_fps
+
+    def reset(self):
+        """Back to the idle rate, e.g. after the camera was paused."""
+        self.active = False
+        self._last_active = None
+        self._next_sample = 0.0
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import time
+
+
+class ClipIndex:
+    """
+    Small SQLite index of the recorded clips, so questions like "events with a face in the
+    last 24 hours" are answered without opening any video file.
+
+    One motion event can span several clips when it is longer than the maximum segment
+    length; its clips share the same event_id.
+
+    Args:
+        db_path (str): SQLite file of the index.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    start_time REAL NOT NULL,
+                    end_time REAL NOT NULL,
+                    frame_count INTEGER NOT NULL,
+                    peak_motion REAL NOT NULL,
+                    face_found INTEGER NOT NULL DEFAULT 0
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS clips_start ON clips(start_time)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS clips_event ON clips(event_id)")
+
+    def add_clip(self, event_id, path, start_time, end_time, frame_count, peak_motion, face_found=False):
+        """Records a finished clip. peak_motion is the largest share of changed pixels (0-1)."""
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO clips (event_id, path, start_time, end_time, frame_count, peak_motion, face_found) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (event_id, path, start_time, end_time, frame_count, peak_motion, int(face_found)))
+            return cursor.lastrowid
+
+    def set_face_found(self, event_id, face_found=True):
+        """Marks all clips of an event once the face scan has finished."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE clips SET face_found = ? WHERE event_id = ?", (int(face_found), event_id))
+
+    def clips(self, since=None, until=None, face_found=None, limit=None):
+        """Returns clips as dicts, newest first, filtered by start time and face flag."""
+        query = "SELECT * FROM clips WHERE 1 = 1"
+        params = []
+        if since is not None:
+            query += " AND start_time >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND start_time < ?"
+            params.append(until)
+        if face_found is not None:
+            query += " AND face_found = ?"
+            params.append(int(face_found))
+        query += " ORDER BY start_time DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query, params)]
+
+    def events_with_faces(self, hours=24.0):
+        """Clips with a face that started in the last hours."""
+        return self.clips(since=time.time() - hours * 3600, face_found=True)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
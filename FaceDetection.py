@@ -1,8 +1,152 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
 import cv2
+import numpy as np
+
+from Metrics import FACE_EVENTS, stage_timer
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Detection window of the Haar cascade; smaller faces are never found
+CASCADE_WINDOW = 24
+
+# Smallest region worth giving to the cascade
+MIN_REGION_SIZE = 2 * CASCADE_WINDOW
+
+_face_seconds = stage_timer("faceDetect")
+
+# Scan workers are spawned, not forked: the calling process already runs grabber,
+# writer and outbox threads, which a forked child would inherit in whatever state they were
+_mp = multiprocessing.get_context("spawn")
+
+
+class FaceDetector:
+    """
+    A loaded CascadeClassifier owned by one thread. Exposes detectMultiScale like the
+    classifier itself and reports the first detection to its pool for the startup metrics.
+    """
+
+    def __init__(self, pool, cascade):
+        self.pool = pool
+        self.cascade = cascade
+
+    def detectMultiScale(self, gray, scaleFactor=1.1, minNeighbors=5, **kwargs):
+        if self.pool.first_detection_time is not None:
+            return self.cascade.detectMultiScale(gray, scaleFactor=scaleFactor, minNeighbors=minNeighbors, **kwargs)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=scaleFactor, minNeighbors=minNeighbors, **kwargs)
+        self.pool.record_first_detection()
+        return faces
+
+    def detectMultiScale3(self, gray, scaleFactor=1.1, minNeighbors=5, **kwargs):
+        # Same as detectMultiScale but also returns reject levels and level weights (confidence)
+        result = self.cascade.detectMultiScale3(gray, scaleFactor=scaleFactor, minNeighbors=minNeighbors,
+                                                outputRejectLevels=True, **kwargs)
+        if self.pool.first_detection_time is None:
+            self.pool.record_first_detection()
+        return result
+
+
+class FaceDetectorPool:
+    """
+    Hands out face detectors loaded once and reused. CascadeClassifier is not safe to share
+    between threads, so every thread gets its own detector and keeps it for its lifetime.
+    warm_up() loads detectors in the background at startup so the first lock event
+    doesn't pay for parsing the cascade XML.
+
+    Args:
+        cascade_path (str): Haar cascade XML file.
+    """
+
+    def __init__(self, cascade_path=CASCADE_PATH):
+        self.cascade_path = cascade_path
+        self.created_at = time.perf_counter()
+        self.load_times = []
+        self.first_detection_time = None
+        self._idle = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        start = time.perf_counter()
+        cascade = cv2.CascadeClassifier(self.cascade_path)
+        if cascade.empty():
+            raise RuntimeError(f"Cannot load face cascade from {self.cascade_path}")
+        with self._lock:
+            self.load_times.append(time.perf_counter() - start)
+        return FaceDetector(self, cascade)
+
+    def get(self):
+        """Returns the calling thread's detector, taking a warmed-up one if available."""
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            with self._lock:
+                detector = self._idle.pop() if self._idle else None
+            if detector is None:
+                detector = self._load()
+            self._local.detector = detector
+        return detector
+
+    def release(self):
+        """Gives the calling thread's detector back so a short-lived thread doesn't take it with it."""
+        detector = getattr(self._local, "detector", None)
+        if detector is not None:
+            self._local.detector = None
+            with self._lock:
+                self._idle.append(detector)
+
+    def warm_up(self, size=1, background=True):
+        """Preloads size detectors, each run once on a blank image."""
+        def load_detectors():
+            blank = np.zeros((64, 64), dtype=np.uint8)
+            for _ in range(size):
+                detector = self._load()
+                detector.cascade.detectMultiScale(blank)
+                with self._lock:
+                    self._idle.append(detector)
+
+        if not background:
+            load_detectors()
+            return None
+        thread = threading.Thread(target=load_detectors, daemon=True)
+        thread.start()
+        return thread
+
+    def record_first_detection(self):
+        with self._lock:
+            if self.first_detection_time is None:
+                self.first_detection_time = time.perf_counter() - self.created_at
+
+    def metrics(self):
+        with self._lock:
+            load_times = list(self.load_times)
+        return {
+            "detectors_loaded": len(load_times),
+            "avg_load_ms": 1000 * sum(load_times) / len(load_times) if load_times else None,
+            "max_load_ms": 1000 * max(load_times) if load_times else None,
+            "first_detection_s": self.first_detection_time,
+        }
+
+
+_detector_pool = None
+_detector_pool_lock = threading.Lock()
+
+
+def get_detector_pool():
+    """Returns the detector pool shared by the whole program."""
+    global _detector_pool
+    with _detector_pool_lock:
+        if _detector_pool is None:
+            _detector_pool = FaceDetectorPool()
+        return _detector_pool
+
 
 def faceDetect():
     # Load the pre-trained Haar Cascade face detector
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    face_cascade = get_detector_pool().get()
 
     # Open the video file
     cap = cv2.VideoCapture(r"C:\Users\esma-\dev\CameraDetection\output.avi")
@@ -26,4 +170,474 @@ def faceDetect():
     if face_found:
         print("Face detected in the video.")
     else:
-        print("No face detected in the video.")
\ No newline at end of file
+        print("No face detected in the video.")
+
+
+def scan_video(video_path, stride=1, stride_seconds=None, coarse_to_fine=False, scale_factor=1.1, min_neighbors=5,
+               min_size=None):
+    """
+    Looks for a face in a video file without decoding every frame.
+
+    Args:
+        video_path (str): Video file to scan.
+        stride (int): Scan every Nth frame. Skipped frames are only grabbed, never retrieved.
+        stride_seconds (float): Stride given in seconds of video instead of frames.
+        coarse_to_fine (bool): Scan the sampled frames with relaxed settings, then confirm a
+            hit with the full settings on it and its neighbours. The coarse pass only runs at
+            half resolution when min_size is at least twice the cascade window, since smaller
+            faces vanish there; if it finds nothing the sampled frames are scanned again in full.
+        min_size (tuple): Smallest (width, height) of a face to look for.
+
+    Returns:
+        dict: face_found, frame_index and box of the hit, plus frames_grabbed,
+        frames_decoded and frames_scanned for the run.
+    """
+    result = {"face_found": False, "frame_index": None, "box": None,
+              "frames_grabbed": 0, "frames_decoded": 0, "frames_scanned": 0}
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Cannot open video file {video_path}")
+        return result
+
+    if stride_seconds is not None:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+        stride = int(round(stride_seconds * fps))
+    stride = max(1, int(stride))
+    face_cascade = get_detector_pool().get()
+    size_options = {"minSize": tuple(min_size)} if min_size else {}
+    downscale = coarse_to_fine and min_size is not None and min(min_size) >= 2 * CASCADE_WINDOW
+
+    def detect(frame, coarse=False):
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        result["frames_scanned"] += 1
+        if coarse and downscale:
+            faces = face_cascade.detectMultiScale(cv2.pyrDown(gray), scaleFactor=scale_factor, minNeighbors=max(1, min_neighbors - 2),
+                                                  minSize=(min_size[0] // 2, min_size[1] // 2))
+        elif coarse:
+            faces = face_cascade.detectMultiScale(gray, scaleFactor=scale_factor, minNeighbors=max(1, min_neighbors - 2), **size_options)
+        else:
+            faces = face_cascade.detectMultiScale(gray, scaleFactor=scale_factor, minNeighbors=min_neighbors, **size_options)
+        _face_seconds.observe(time.perf_counter() - start)
+        return faces
+
+    def confirm_around(hit_index):
+        # Go back to the frames around a coarse hit and check them at full resolution
+        first = max(0, hit_index - stride + 1)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        for index in range(first, hit_index + stride):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            result["frames_decoded"] += 1
+            faces = detect(frame)
+            if len(faces) > 0:
+                return index, faces[0]
+        return None, None
+
+    index = 0
+    while True:
+        if index % stride != 0:
+            if not cap.grab():
+                break
+            result["frames_grabbed"] += 1
+            index += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+        result["frames_decoded"] += 1
+        faces = detect(frame, coarse=coarse_to_fine)
+        if len(faces) > 0:
+            if not coarse_to_fine:
+                hit_index, box = index, faces[0]
+            else:
+                hit_index, box = confirm_around(index)
+                if hit_index is None:
+                    # False alarm from the coarse pass, continue after the neighbours we checked
+                    index += stride
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                    continue
+            result["face_found"] = True
+            result["frame_index"] = hit_index
+            result["box"] = tuple(int(v) for v in box)
+            break
+        index += 1
+
+    cap.release()
+    if downscale and not result["face_found"]:
+        # A face the half-resolution pass missed may still be there at full resolution
+        full = scan_video(video_path, stride=stride, scale_factor=scale_factor, min_neighbors=min_neighbors,
+                          min_size=min_size)
+        for key in ("frames_grabbed", "frames_decoded", "frames_scanned"):
+            full[key] += result[key]
+        return full
+    return result
+
+
+def _scan_range(video_path, start, end, first_hit, results, scale_factor, min_neighbors):
+    # Runs in a worker process: scan frames [start, end) with this process's own detector.
+    # first_hit is the earliest frame with a face found by any worker so far; frames after it
+    # don't matter any more, frames before it still do
+    hit = None
+    timings = []
+    cap = cv2.VideoCapture(video_path)
+    if cap.isOpened():
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        face_cascade = get_detector_pool().get()
+        for index in range(start, end):
+            if index >= first_hit.value:
+                break
+            ret, frame = cap.read()
+            if not ret:
+                break
+            started = time.perf_counter()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_cascade.detectMultiScale(gray, scaleFactor=scale_factor, minNeighbors=min_neighbors)
+            timings.append(time.perf_counter() - started)
+            if len(faces) > 0:
+                hit = (index, tuple(int(v) for v in faces[0]))
+                with first_hit.get_lock():
+                    first_hit.value = min(first_hit.value, index)
+                break
+        cap.release()
+    # The stage timings of this process would be lost with it; the parent records them
+    results.put((hit, timings))
+
+
+def parallel_scan_video(video_path, workers=None, min_frames_per_worker=50, scale_factor=1.1, min_neighbors=5):
+    """
+    Splits a video into frame ranges and scans each one in its own process.
+    Once a worker finds a face, the workers scanning later frames stop; the ones before it
+    go on, so the earliest face of the video is reported.
+
+    Args:
+        video_path (str): Video file to scan.
+        workers (int): Number of processes, defaults to the number of CPUs.
+        min_frames_per_worker (int): Short clips are split into fewer ranges, since
+            starting a process costs more than scanning a handful of frames.
+
+    Returns:
+        tuple: (face_found, frame_index, box). frame_index and box are None when no face was found.
+
+    If a worker dies (out of memory, a crash in OpenCV) the others are stopped and the
+    video is scanned again in this process with scan_video.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Cannot open video file {video_path}")
+        return False, None, None
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, frame_count // max(1, min_frames_per_worker)))
+    if frame_count <= 0 or workers == 1:
+        # Unknown length or too short to be worth splitting
+        result = scan_video(video_path, scale_factor=scale_factor, min_neighbors=min_neighbors)
+        return result["face_found"], result["frame_index"], result["box"]
+
+    chunk = -(-frame_count // workers)
+    first_hit = _mp.Value("q", frame_count)
+    results = _mp.Queue()
+    processes = []
+    for start in range(0, frame_count, chunk):
+        process = _mp.Process(
+            target=_scan_range,
+            args=(video_path, start, min(start + chunk, frame_count), first_hit, results, scale_factor, min_neighbors),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+
+    hits = []
+    received = 0
+    failed = False
+    while received < len(processes):
+        try:
+            hit, timings = results.get(timeout=0.5)
+        except queue.Empty:
+            # A worker that exits normally has put its result first, so the queue being
+            # empty with a crashed worker (or with every worker gone) means one is lost
+            if any(process.exitcode not in (None, 0) for process in processes) or \
+                    not any(process.is_alive() for process in processes):
+                failed = True
+                break
+            continue
+        received += 1
+        for seconds in timings:
+            _face_seconds.observe(seconds)
+        if hit is not None:
+            hits.append(hit)
+
+    if failed:
+        # Every frame index is past -1, so all workers stop
+        first_hit.value = -1
+        for process in processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        codes = [process.exitcode for process in processes]
+        print(f"Parallel face scan failed (worker exit codes {codes}), scanning in this process.")
+        result = scan_video(video_path, scale_factor=scale_factor, min_neighbors=min_neighbors)
+        return result["face_found"], result["frame_index"], result["box"]
+
+    for process in processes:
+        process.join()
+
+    if not hits:
+        return False, None, None
+    # Workers before the earliest hit scan their whole range, so the smallest hit is the first face
+    frame_index, box = min(hits)
+    return True, frame_index, box
+
+
+def merge_boxes(boxes):
+    """Merges overlapping or touching (x, y, w, h) boxes until none overlap."""
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                ax, ay, aw, ah = boxes[i]
+                bx, by, bw, bh = boxes[j]
+                if ax <= bx + bw and bx <= ax + aw and ay <= by + bh and by <= ay + ah:
+                    x0, y0 = min(ax, bx), min(ay, by)
+                    x1, y1 = max(ax + aw, bx + bw), max(ay + ah, by + bh)
+                    boxes[i] = [x0, y0, x1 - x0, y1 - y0]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(b) for b in boxes]
+
+
+def motion_regions(motion_mask, frame_size, scale=(1.0, 1.0), padding=0.25, min_area=25):
+    """
+    Turns a thresholded motion mask into padded, merged regions in full-frame coordinates.
+
+    Args:
+        motion_mask (numpy.ndarray): Binary mask from the motion detector (may be downscaled).
+        frame_size (tuple): (width, height) of the full-resolution frame.
+        scale (tuple): Full-frame pixels per mask pixel along x and y.
+        padding (float): Extra margin around each region, as a fraction of its size.
+            A head often sits just outside the moving pixels, so this should not be too small.
+        min_area (int): Contours smaller than this (in mask pixels) are treated as noise.
+    """
+    frame_width, frame_height = frame_size
+    scale_x, scale_y = scale
+    # Join nearby blobs (e.g. the outline of one moving person) before taking contours
+    mask = cv2.dilate(motion_mask, None, iterations=2)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        if cv2.contourArea(contour) < min_area:
+            continue
+        x, y, w, h = cv2.boundingRect(contour)
+        x, y, w, h = x * scale_x, y * scale_y, w * scale_x, h * scale_y
+        pad_x = max(w * padding, (MIN_REGION_SIZE - w) / 2, 0)
+        pad_y = max(h * padding, (MIN_REGION_SIZE - h) / 2, 0)
+        x0 = max(0, int(x - pad_x))
+        y0 = max(0, int(y - pad_y))
+        x1 = min(frame_width, int(x + w + pad_x))
+        y1 = min(frame_height, int(y + h + pad_y))
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return merge_boxes(boxes)
+
+
+def detect_faces_in_regions(face_cascade, gray, regions, scale_factor=1.1, min_neighbors=5):
+    """
+    Runs the cascade only inside regions.
+    Returns (faces, weights) with faces in full-frame coordinates and their confidence weights.
+    """
+    faces = []
+    weights = []
+    for x, y, w, h in regions:
+        if w < MIN_REGION_SIZE or h < MIN_REGION_SIZE:
+            continue
+        roi_faces, _, roi_weights = face_cascade.detectMultiScale3(gray[y:y + h, x:x + w], scaleFactor=scale_factor, minNeighbors=min_neighbors)
+        for (fx, fy, fw, fh), weight in zip(roi_faces, roi_weights):
+            faces.append((int(fx) + x, int(fy) + y, int(fw), int(fh)))
+            weights.append(float(weight))
+    return faces, weights
+
+
+class BestFrameSelector:
+    """
+    Keeps the best few frames with a face seen so far, so the alert can use a good picture
+    without reading the clip again.
+
+    A candidate's score combines how big the face is, how sharp it is (variance of the
+    Laplacian inside the face) and the cascade's confidence weight for it.
+
+    Args:
+        keep (int): Number of candidates kept in memory.
+    """
+
+    def __init__(self, keep=3):
+        self.keep = keep
+        self.candidates = []  # (score, frame, box), best first
+
+    @staticmethod
+    def score(gray, box, weight=None):
+        x, y, w, h = box
+        frame_height, frame_width = gray.shape[:2]
+        size = ((w * h) / (frame_width * frame_height)) ** 0.5
+        variance = cv2.Laplacian(gray[y:y + h, x:x + w], cv2.CV_64F).var()
+        sharpness = variance / (variance + 100.0)
+        confidence = 1.0 if weight is None else max(weight, 0.1) / (max(weight, 0.1) + 2.0)
+        return size * sharpness * confidence
+
+    def consider(self, frame, gray, faces, weights=None):
+        """Scores the faces found in frame and keeps the frame if it beats a current candidate."""
+        if len(faces) == 0:
+            return False
+        if weights is None or len(weights) != len(faces):
+            weights = [None] * len(faces)
+        score, box = max((self.score(gray, tuple(int(v) for v in face), weight), tuple(int(v) for v in face))
+                         for face, weight in zip(faces, weights))
+        if len(self.candidates) >= self.keep and score <= self.candidates[-1][0]:
+            return False
+        self.candidates.append((score, frame, box))
+        self.candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        del self.candidates[self.keep:]
+        return True
+
+    def best(self):
+        """Returns (frame, box, score) of the best candidate, or (None, None, 0.0)."""
+        if not self.candidates:
+            return None, None, 0.0
+        score, frame, box = self.candidates[0]
+        return frame, box, score
+
+    def encode_best(self, quality=90):
+        """Returns the best frame as JPEG bytes, encoded in memory, or None."""
+        frame, _, _ = self.best()
+        if frame is None:
+            return None
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if ok else None
+
+
+class FaceScanWorker:
+    """
+    Runs face detection on live frames on a background thread while a clip is being
+    recorded, so the result is ready when recording ends without decoding the clip again.
+
+    Frames are handed over with submit(). When the worker is still busy and its queue is
+    full the frame is skipped, so the capture loop is never slowed down by the cascade.
+    face_found is set at the first face; scanning goes on until face_frames_wanted frames
+    with a face were seen so the best of them can be used for the alert.
+
+    Args:
+        max_queue (int): Frames waiting to be scanned before new ones are skipped.
+        face_frames_wanted (int): Stop scanning after this many frames with a face.
+        scale_factor (float): detectMultiScale scale factor.
+        min_neighbors (int): detectMultiScale minimum neighbours.
+        roi_only (bool): Only search the parts of the frame that moved. Needs the motion
+            mask or the regions to be passed to submit(); frames without them are scanned in full.
+    """
+
+    def __init__(self, max_queue=4, scale_factor=1.1, min_neighbors=5, roi_only=False, face_frames_wanted=10):
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.face_frames_wanted = face_frames_wanted
+        self.face_frames_seen = 0
+        self.best_frames = BestFrameSelector()
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.roi_only = roi_only
+        self.face_found = threading.Event()
+        self.face_frame = None
+        self.face_box = None
+        self.frames_scanned = 0
+        self.frames_skipped = 0
+        # Share of the frame area actually given to the cascade
+        self.pixels_scanned = 0
+        self.pixels_total = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._scan_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _scan_loop(self):
+        face_cascade = get_detector_pool().get()
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            if self._done():
+                # Keep draining so finish() never waits on a full queue
+                continue
+            frame, motion_mask, mask_scale, regions = item
+            start = time.perf_counter()
+            height, width = frame.shape[:2]
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if self.roi_only and (regions is not None or motion_mask is not None):
+                if regions is None:
+                    regions = motion_regions(motion_mask, (width, height), mask_scale)
+                else:
+                    regions = merge_boxes(regions)
+                faces, weights = detect_faces_in_regions(face_cascade, gray, regions, self.scale_factor, self.min_neighbors)
+                self.pixels_scanned += sum(w * h for _, _, w, h in regions)
+            else:
+                faces, _, weights = face_cascade.detectMultiScale3(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors)
+                self.pixels_scanned += width * height
+            _face_seconds.observe(time.perf_counter() - start)
+            self.pixels_total += width * height
+            self.frames_scanned += 1
+            if len(faces) > 0:
+                self.face_frames_seen += 1
+                if self.best_frames.consider(frame, gray, faces, weights):
+                    self.face_frame, self.face_box, _ = self.best_frames.best()
+                self.face_found.set()
+        get_detector_pool().release()
+
+    def _done(self):
+        return self.face_frames_seen >= self.face_frames_wanted
+
+    def submit(self, frame, motion_mask=None, mask_scale=(1.0, 1.0), copy=False, regions=None):
+        """
+        Queues a frame for scanning. Returns False if it was skipped.
+        motion_mask and mask_scale are used by roi_only to find the regions to search, unless
+        the regions (full-frame boxes, e.g. the fired motion tiles) are given directly.
+        Use copy=True when the caller reuses the frame and mask buffers; only frames that
+        are actually queued are copied.
+        """
+        if self._done():
+            return False
+        if self.frames.full():
+            # Skip before copying; the worker is the only consumer, so this can't be wrong for long
+            self.frames_skipped += 1
+            return False
+        if copy:
+            frame = frame.copy()
+            # The mask is only looked at by roi_only, and only without regions
+            motion_mask = motion_mask.copy() if motion_mask is not None and self.roi_only and regions is None else None
+        try:
+            self.frames.put_nowait((frame, motion_mask, mask_scale, regions))
+            return True
+        except queue.Full:
+            self.frames_skipped += 1
+            return False
+
+    def finish(self):
+        """Waits for the queued frames to be scanned and returns whether a face was found."""
+        if self._thread is not None:
+            self.frames.put(None)
+            self._thread.join()
+            self._thread = None
+            coverage = self.pixels_scanned / self.pixels_total if self.pixels_total else 0.0
+            print(f"Face scan: {self.frames_scanned} frames scanned, {self.frames_skipped} skipped, {coverage:.0%} of the frame area searched.")
+            if self.face_found.is_set():
+                FACE_EVENTS.inc()
+        return self.face_found.is_set()
+
+    def best_jpeg(self, quality=90):
+        """Returns the best face frame as in-memory JPEG bytes, or None if no face was found."""
+        return self.best_frames.encode_best(quality)
@@ -0,0 +1,212 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from Metrics import FRAMES_CAPTURED, FRAMES_DROPPED, FRAMES_SKIPPED, stage_timer
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+
+WALL_CLOCK = "wall"
+STREAM_CLOCK = "stream"
+
+_read_seconds = stage_timer("read")
+
+
+class FrameGrabber:
+    """
+    Reads frames from an opened camera on its own thread and hands them to the
+    consumer through a bounded queue, so a slow consumer no longer stalls the camera.
+
+    Args:
+        cap (cv2.VideoCapture): An already opened capture device.
+        max_queue (int): Maximum number of frames waiting for the consumer.
+        drop_policy (str): "drop_oldest" discards the oldest waiting frame when the
+            queue is full, "block" makes the capture thread wait for the consumer.
+        scheduler (CaptureScheduler): If given, frames it does not ask for are only
+            grabbed, not decoded or queued.
+        reuse_buffers (bool): Decode into recycled frame buffers instead of a new array per
+            frame. A frame returned by read() is then only valid until the next read().
+        clock (str): "wall" stamps frames with the time they were read, for cameras.
+            "stream" uses the frame's position in the stream (CAP_PROP_POS_MSEC), counted from
+            the start time, for video files and streams that are decoded faster than real time.
+    """
+
+    def __init__(self, cap, max_queue=32, drop_policy=DROP_OLDEST, scheduler=None, reuse_buffers=False,
+                 clock=WALL_CLOCK):
+        if drop_policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown drop policy: {drop_policy}. Use '{DROP_OLDEST}' or '{BLOCK}'.")
+        if clock not in (WALL_CLOCK, STREAM_CLOCK):
+            raise ValueError(f"Unknown clock: {clock}. Use '{WALL_CLOCK}' or '{STREAM_CLOCK}'.")
+        self.cap = cap
+        self.clock = clock
+        # Stream clock: wall time of the first frame, its stream position and the last frame's time
+        self._stream_start = None
+        self._stream_origin = None
+        self._stream_time = None
+        # Stream time per frame when the backend reports no positions
+        nominal_fps = cap.get(cv2.CAP_PROP_FPS) if clock == STREAM_CLOCK else 0
+        self._stream_step = 1.0 / nominal_fps if 0 < nominal_fps <= 240 else 0.05
+        self.drop_policy = drop_policy
+        self.scheduler = scheduler
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        # Average seconds between frames delivered by the camera, decoded or not
+        self.frame_interval = None
+        self._last_frame_time = None
+        self.reuse_buffers = reuse_buffers
+        # Buffers free for the next decode: queued frames, the one lent to the consumer
+        # and the one being decoded are all that can be in use at the same time
+        self._free_buffers = deque(maxlen=max_queue + 2)
+        self._lent = None
+        self._stop_event = threading.Event()
+        self._ended = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        while not self._stop_event.is_set():
+            if not self._running.is_set():
+                # Paused: the device stays open but no frames are read
+                self._running.wait(timeout=0.2)
+                continue
+            start = time.perf_counter()
+            # Grabbed first, so the scheduler sees the frame's own timestamp
+            if not self.cap.grab():
+                break
+            timestamp = self._timestamp()
+            self._measure_rate(timestamp)
+            if self.scheduler is not None and not self.scheduler.due(timestamp):
+                # Idle: the frame is taken off the camera without decoding it
+                self.frames_skipped += 1
+                FRAMES_SKIPPED.inc()
+                continue
+            if self._free_buffers:
+                ret, frame = self.cap.retrieve(image=self._free_buffers.pop())
+            else:
+                ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            _read_seconds.observe(time.perf_counter() - start)
+            self.frames_captured += 1
+            FRAMES_CAPTURED.inc()
+            self._put((frame, timestamp))
+        self._ended.set()
+
+    def _timestamp(self):
+        if self.clock == WALL_CLOCK:
+            return time.time()
+        position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if self._stream_time is None:
+            self._stream_start, self._stream_origin = time.time(), position
+            self._stream_time = self._stream_start
+            return self._stream_time
+        timestamp = self._stream_start + position - self._stream_origin
+        if timestamp <= self._stream_time:
+            # No usable position from the backend: advance by the nominal frame interval
+            timestamp = self._stream_time + self._stream_step
+        self._stream_time = timestamp
+        return timestamp
+
+    def _measure_rate(self, now):
+        if self._last_frame_time is not None:
+            interval = now - self._last_frame_time
+            if self.frame_interval is None:
+                self.frame_interval = interval
+            else:
+                self.frame_interval += 0.05 * (interval - self.frame_interval)
+        self._last_frame_time = now
+
+    def capture_fps(self):
+        """Rate the camera delivers frames at (in stream time with the stream clock), or None before it is known."""
+        if not self.frame_interval:
+            return None
+        return 1.0 / self.frame_interval
+
+    def _put(self, item):
+        if self.drop_policy == BLOCK:
+            # Wait for room, but keep checking so stop() never deadlocks on a full queue
+            while not self._stop_event.is_set():
+                try:
+                    self.frames.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            return
+
+        try:
+            self.frames.put_nowait(item)
+        except queue.Full:
+            # This thread is the only producer, so removing one frame always makes room
+            try:
+                self._recycle(self.frames.get_nowait()[0])
+            except queue.Empty:
+                pass
+            self.frames_dropped += 1
+            FRAMES_DROPPED.inc()
+            self.frames.put_nowait(item)
+
+    def read(self, timeout=0.1, stop_event=None):
+        """
+        Returns (ret, frame, timestamp) for the next captured frame.
+        ret is False once the camera stopped delivering frames and the queue is empty, or
+        when stop_event is set while waiting (a stalled camera or a paused grabber would
+        otherwise keep the caller waiting forever).
+        """
+        if self._lent is not None:
+            # The consumer is done with the previous frame
+            self._recycle(self._lent)
+            self._lent = None
+        while True:
+            try:
+                frame, timestamp = self.frames.get(timeout=timeout)
+                if self.reuse_buffers:
+                    self._lent = frame
+                return True, frame, timestamp
+            except queue.Empty:
+                if self._ended.is_set() and self.frames.empty():
+                    return False, None, None
+                if stop_event is not None and stop_event.is_set():
+                    return False, None, None
+
+    def _recycle(self, frame):
+        if self.reuse_buffers:
+            self._free_buffers.append(frame)
+
+    def pause(self):
+        """Stops reading frames without releasing the camera and drops the frames not yet consumed."""
+        self._running.clear()
+        # The gap until resume() is not a frame interval
+        self._last_frame_time = None
+        while True:
+            try:
+                self._recycle(self.frames.get_nowait()[0])
+            except queue.Empty:
+                break
+
+    def resume(self):
+        self._running.set()
+
+    def ended(self):
+        """True once the camera stopped delivering frames and all of them were read."""
+        return self._ended.is_set() and self.frames.empty()
+
+    def backlog(self):
+        return self.frames.qsize()
+
+    def stop(self):
+        self._stop_event.set()
+        self._running.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
@@ -0,0 +1,163 @@
+import os
+import platform
+import re
+import subprocess
+import threading
+
+# Lines printed by `gdbus monitor` for the logind session object
+_LOCKED_HINT = re.compile(r"'LockedHint': <(true|false)>")
+_LOCK_SIGNAL = re.compile(r"org\.freedesktop\.login1\.Session\.(Lock|Unlock) \(")
+
+
+def find_session_id():
+    """Returns the logind session id of this login, resolved without a shell."""
+    session_id = os.environ.get("XDG_SESSION_ID")
+    if session_id:
+        return session_id
+    output = subprocess.check_output(["loginctl", "list-sessions", "--no-legend"], text=True)
+    lines = [line.split() for line in output.splitlines() if line.strip()]
+    # Same choice as before: the session attached to a tty/seat
+    for fields in lines:
+        if any(field.startswith("tty") or field.startswith("seat") for field in fields[1:]):
+            return fields[0]
+    return lines[0][0] if lines else None
+
+
+def session_object_path(session_id):
+    """D-Bus object path of a logind session (ids are escaped like sd_bus_path_encode)."""
+    escaped = ""
+    for i, char in enumerate(session_id):
+        if char.isalpha() or (char.isdigit() and i > 0):
+            escaped += char
+        else:
+            escaped += "_%02x" % ord(char)
+    return f"/org/freedesktop/login1/session/{escaped}"
+
+
+class ScreenLockMonitor:
+    """
+    Keeps track of the screen lock state and publishes lock/unlock transitions, so the
+    main loop can wait for them instead of starting shell pipelines many times a second.
+
+    On Linux the logind session is resolved once and one long-lived `gdbus monitor`
+    process streams its LockedHint changes. If that watcher is not available or dies,
+    the session is polled with a single loginctl call per poll_interval. On other
+    systems poll_function is called every poll_interval.
+
+    Args:
+        poll_function (callable): Returns True when the screen is locked; used where no
+            event stream is available.
+        poll_interval (float): Seconds between polls in polling mode.
+        watch_command (list): Command whose output lines carry the lock events. Defaults to
+            gdbus monitor on the session; a fake bus can stand in for it.
+        state_command (list): Command printing the current LockedHint ("yes"/"no").
+    """
+
+    def __init__(self, poll_function=None, poll_interval=0.5, watch_command=None, state_command=None):
+        self.poll_function = poll_function
+        self.poll_interval = poll_interval
+        self.watch_command = watch_command
+        self.state_command = state_command
+        self.transitions = 0
+        self._locked = False
+        self._subscribers = []
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._process = None
+        self._thread = None
+
+    def subscribe(self, callback, replay=False):
+        """
+        callback(locked) is called on every lock/unlock transition, on the monitor thread.
+        With replay it is also called right away with the current state; no transition can
+        fall between that call and the subscription.
+        """
+        with self._condition:
+            self._subscribers.append(callback)
+            if replay:
+                callback(self._locked)
+
+    def is_locked(self):
+        """Last known state; costs no subprocess."""
+        return self._locked
+
+    def wait_for(self, locked, timeout=None):
+        """Blocks until the screen is in the given state. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._locked == locked or self._stop_event.is_set(), timeout)
+
+    def _publish(self, locked):
+        with self._condition:
+            if locked == self._locked:
+                return
+            self._locked = locked
+            self.transitions += 1
+            self._condition.notify_all()
+        for callback in self._subscribers:
+            callback(locked)
+
+    def start(self):
+        if platform.system() == "Linux" and self.watch_command is None:
+            # Resolve the session once, then watch it for the rest of the run
+            try:
+                session_id = find_session_id()
+            except (OSError, subprocess.CalledProcessError):
+                session_id = None
+            if session_id is not None:
+                if self.state_command is None:
+                    self.state_command = ["loginctl", "show-session", session_id, "-p", "LockedHint", "--value"]
+                self.watch_command = ["gdbus", "monitor", "--system", "--dest", "org.freedesktop.login1",
+                                      "--object-path", session_object_path(session_id)]
+
+        target = self._watch_loop if self.watch_command is not None else self._poll_loop
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        return self
+
+    def _query_state(self):
+        if self.state_command is not None:
+            try:
+                output = subprocess.check_output(self.state_command, text=True)
+                return output.strip() == "yes"
+            except (OSError, subprocess.CalledProcessError):
+                return self._locked
+        if self.poll_function is not None:
+            return bool(self.poll_function())
+        return False
+
+    def _watch_loop(self):
+        # Start the watcher first so no change between the query and the stream is missed
+        try:
+            self._process = subprocess.Popen(self.watch_command, stdout=subprocess.PIPE,
+                                             stderr=subprocess.DEVNULL, text=True)
+        except OSError:
+            self._process = None
+        self._publish(self._query_state())
+        if self._process is not None:
+            for line in self._process.stdout:
+                if self._stop_event.is_set():
+                    break
+                match = _LOCKED_HINT.search(line)
+                if match:
+                    self._publish(match.group(1) == "true")
+                    continue
+                match = _LOCK_SIGNAL.search(line)
+                if match:
+                    self._publish(match.group(1) == "Lock")
+        if not self._stop_event.is_set():
+            print("Lock monitor: event stream not available, falling back to polling.")
+            self._poll_loop()
+
+    def _poll_loop(self):
+        while not self._stop_event.is_set():
+            self._publish(self._query_state())
+            self._stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._process is not None:
+            self._process.terminate()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
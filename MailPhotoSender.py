@@ -1,13 +1,96 @@
 import os
 from email.message import EmailMessage
 import smtplib
+import time
+
+import cv2
+import numpy as np
+
+from Metrics import stage_timer
+
+_mail_seconds = stage_timer("mail")
+
+
+def image_subtype(data):
+    """Returns the MIME image subtype of encoded image bytes (jpeg, png, gif, bmp, webp)."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:2] == b"BM":
+        return "bmp"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "jpeg"
+
+
+def encode_image(image, max_bytes=200_000, max_width=1280, quality=90, min_quality=40, face_box=None, margin=0.5):
+    """
+    Encodes a frame as JPEG in memory, small enough for an e-mail.
+
+    Args:
+        image (numpy.ndarray or bytes): BGR frame, or already encoded image bytes.
+        max_bytes (int): Size budget for the result.
+        max_width (int): Frames wider than this are scaled down first.
+        quality (int): Highest JPEG quality to try.
+        min_quality (int): Lowest JPEG quality before the image is scaled down further.
+        face_box (tuple): Optional (x, y, w, h); the image is cropped to it plus margin.
+        margin (float): Extra space around face_box, as a fraction of its size.
+
+    Returns:
+        bytes: The encoded image. Encoded input that already fits and needs no crop
+        is returned unchanged.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        if face_box is None and len(image) <= max_bytes:
+            return bytes(image)
+        image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Cannot decode image data.")
+
+    if face_box is not None:
+        x, y, w, h = face_box
+        pad_x, pad_y = int(w * margin), int(h * margin)
+        height, width = image.shape[:2]
+        image = image[max(0, y - pad_y):min(height, y + h + pad_y), max(0, x - pad_x):min(width, x + w + pad_x)]
+
+    height, width = image.shape[:2]
+    if width > max_width:
+        image = cv2.resize(image, (max_width, int(round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+
+    while True:
+        # Highest quality that still fits the budget, found by binary search
+        best = None
+        low, high = min_quality, quality
+        while low <= high:
+            middle = (low + high) // 2
+            ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, middle])
+            if ok and buffer.nbytes <= max_bytes:
+                best = buffer
+                low = middle + 1
+            else:
+                high = middle - 1
+        if best is not None:
+            return best.tobytes()
+
+        height, width = image.shape[:2]
+        if width <= 160:
+            # Cannot get smaller in a useful way, send it over budget
+            ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, min_quality])
+            return buffer.tobytes()
+        image = cv2.resize(image, (int(width * 0.75), int(height * 0.75)), interpolation=cv2.INTER_AREA)
+
 
 class MailPhotoSender:
-    def __init__(self, from_email, password, smtp_server, smtp_port):
+    def __init__(self, from_email, password, smtp_server, smtp_port, pool=None):
         self.from_email = from_email
         self.password = password
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
+        # Optional MailSessionPool, reuses logged-in sessions instead of connecting per message
+        self.pool = pool
 
     # --- EN ÖNEMLİ DEĞİŞİKLİK BURADA ---
     # image_path için sabit kodlanmış varsayılan değer kaldırıldı.
@@ -22,24 +105,58 @@ class MailPhotoSender:
             print(f"HATA: E-posta gönderilemedi çünkü resim dosyası bulunamadı: {image_path}")
             return # Dosya yoksa fonksiyonu durdur
 
+        try:
+            with open(image_path, 'rb') as img:
+                img_data = img.read()
+        except OSError as e:
+            print(f"E-posta error: {e}")
+            return
+
+        # Dosya adını yoldan otomatik olarak al
+        img_name = os.path.basename(image_path)
+        self.send_mail_with_image_data(subject, body, to_email, img_data, filename=img_name)
+
+    def send_mail_with_frame(self, subject, body, to_email, frame, max_bytes=200_000, face_box=None, filename="face.jpg"):
+        """
+        Sends an e-mail with a camera frame (or raw image bytes) encoded in memory,
+        scaled and compressed to stay under max_bytes, optionally cropped to face_box.
+        """
+        image_data = encode_image(frame, max_bytes=max_bytes, face_box=face_box)
+        self.send_mail_with_image_data(subject, body, to_email, image_data, filename=filename)
+
+    def send_mail_with_image_data(self, subject, body, to_email, image_data, filename="face.jpg"):
+        """
+        Sends an e-mail with an image that is already in memory (e.g. bytes from
+        cv2.imencode), so nothing has to be written to disk first.
+        """
+        msg = self.build_message(subject, body, to_email, [(filename, image_data)])
+
+        try:
+            self.send_message(msg)
+            print(f"E-posta sent to {to_email} successfully.")
+
+        except Exception as e:
+            print(f"E-posta error: {e}")
+
+    def build_message(self, subject, body, to_email, attachments):
+        """attachments is a list of (filename, image_bytes); the image type is taken from the bytes."""
         msg = EmailMessage()
         msg['Subject'] = subject
         msg['From'] = self.from_email
         msg['To'] = to_email
         msg.set_content(body)
+        for filename, image_data in attachments:
+            msg.add_attachment(image_data, maintype='image', subtype=image_subtype(image_data), filename=filename)
+        return msg
 
-        try:
-            with open(image_path, 'rb') as img:
-                img_data = img.read()
-                # Dosya adını yoldan otomatik olarak al
-                img_name = os.path.basename(image_path) 
-                msg.add_attachment(img_data, maintype='image', subtype='jpeg', filename=img_name)
-
+    def send_message(self, msg):
+        """Sends a prepared message. Unlike the send_mail_* methods, errors are raised to the caller."""
+        start = time.perf_counter()
+        if self.pool is not None:
+            self.pool.send_message(msg)
+        else:
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as smtp:
                 smtp.starttls()
                 smtp.login(self.from_email, self.password)
                 smtp.send_message(msg)
-            print(f"E-posta sent to {to_email} successfully.")
-
-        except Exception as e:
-            print(f"E-posta error: {e}")
\ No newline at end of file
+        _mail_seconds.observe(time.perf_counter() - start)
\ No newline at end of file
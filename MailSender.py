@@ -1,14 +1,21 @@
 import smtplib
+import time
 from email.message import EmailMessage
 from dotenv import load_dotenv
 import os
 
+from Metrics import stage_timer
+
+_mail_seconds = stage_timer("mail")
+
 class MailSender:
-    def __init__(self, from_email, password, smtp_server, smtp_port):
+    def __init__(self, from_email, password, smtp_server, smtp_port, pool=None):
         self.from_email = from_email
         self.password = password
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
+        # Optional MailSessionPool, reuses logged-in sessions instead of connecting per message
+        self.pool = pool
 
     def send_mail(self, subject, body, to_email):
         msg = EmailMessage()
@@ -17,10 +24,15 @@ class MailSender:
         msg['To'] = to_email
         msg.set_content(body)
 
-        with smtplib.SMTP(self.smtp_server, self.smtp_port) as smtp:
-            smtp.starttls()
-            smtp.login(self.from_email, self.password)
-            smtp.send_message(msg)
+        start = time.perf_counter()
+        if self.pool is not None:
+            self.pool.send_message(msg)
+        else:
+            with smtplib.SMTP(self.smtp_server, self.smtp_port) as smtp:
+                smtp.starttls()
+                smtp.login(self.from_email, self.password)
+                smtp.send_message(msg)
+        _mail_seconds.observe(time.perf_counter() - start)
             
 
 
@@ -0,0 +1,164 @@
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class MailSessionPool:
+    """
+    Keeps authenticated SMTP sessions open and reuses them, so a message no longer pays
+    for a TCP connect, STARTTLS handshake and login every time.
+
+    A session that has been idle for a while is checked with NOOP before it is reused,
+    sessions idle for longer than the server is likely to keep them are closed, and a
+    send that fails on a dropped connection is retried once on a new session.
+
+    Args:
+        smtp_server (str): SMTP host, e.g. "smtp.gmail.com".
+        smtp_port (int): SMTP port, e.g. 587.
+        from_email (str): Login user.
+        password (str): Login password (an app password for Gmail).
+        max_sessions (int): Maximum number of sessions open at the same time.
+        use_tls (bool): Upgrade the connection with STARTTLS before logging in.
+        noop_after (float): Idle seconds after which a session is checked with NOOP.
+        max_idle (float): Idle seconds after which a session is closed instead of reused.
+        timeout (float): Socket timeout for the SMTP connection.
+    """
+
+    def __init__(self, smtp_server, smtp_port, from_email, password, max_sessions=2, use_tls=True,
+                 noop_after=5.0, max_idle=240.0, timeout=30.0):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.from_email = from_email
+        self.password = password
+        self.max_sessions = max_sessions
+        self.use_tls = use_tls
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self.messages_sent = 0
+        self.connects = 0
+        self.send_latencies = deque(maxlen=200)
+        self._idle = []  # (smtp, last_used)
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.password:
+                smtp.login(self.from_email, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        self.connects += 1
+        return smtp
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+    @staticmethod
+    def _is_alive(smtp):
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self):
+        """Returns a live, logged-in session. Give it back with release()."""
+        with self._condition:
+            while not self._idle and self._open >= self.max_sessions:
+                self._condition.wait()
+            if self._idle:
+                smtp, last_used = self._idle.pop()
+            else:
+                smtp, last_used = None, None
+                self._open += 1
+
+        try:
+            if smtp is not None:
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.max_idle or (idle_for > self.noop_after and not self._is_alive(smtp)):
+                    # Stale session, the server has probably dropped it already
+                    self._close(smtp)
+                    smtp = None
+            if smtp is None:
+                smtp = self._connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        return smtp
+
+    def release(self, smtp, broken=False):
+        with self._condition:
+            if broken:
+                self._open -= 1
+            else:
+                self._idle.append((smtp, time.monotonic()))
+            self._condition.notify()
+        if broken:
+            self._close(smtp)
+
+    @contextmanager
+    def session(self):
+        smtp = self.acquire()
+        try:
+            yield smtp
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError):
+            self.release(smtp, broken=True)
+            raise
+        except Exception:
+            self.release(smtp)
+            raise
+        else:
+            self.release(smtp)
+
+    def send_message(self, msg):
+        """Sends one message, retrying once on a fresh session if the connection was dropped."""
+        self.send_messages([msg])
+
+    def send_messages(self, messages):
+        """Sends several messages over one session."""
+        messages = list(messages)
+        attempts = 0
+        while messages:
+            try:
+                with self.session() as smtp:
+                    while messages:
+                        start = time.perf_counter()
+                        smtp.send_message(messages[0])
+                        self.send_latencies.append(time.perf_counter() - start)
+                        self.messages_sent += 1
+                        messages.pop(0)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                attempts += 1
+                if attempts > 1:
+                    raise
+
+    def stats(self):
+        latencies = list(self.send_latencies)
+        return {
+            "messages_sent": self.messages_sent,
+            "connects": self.connects,
+            "open_sessions": self._open,
+            "last_send_ms": 1000 * latencies[-1] if latencies else None,
+            "avg_send_ms": 1000 * sum(latencies) / len(latencies) if latencies else None,
+        }
+
+    def close(self):
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+            self._open -= len(idle)
+        for smtp, _ in idle:
+            self._close(smtp)
@@ -1,172 +1,142 @@
 import os
-import cv2
-import time
-import platform
-import numpy as np
-from dotenv import load_dotenv
-import threading
-import ctypes
-import subprocess
 import sys
+import threading
+import time
+
+# Importing this module has no side effects: OpenCV, numpy, dotenv and the detection and
+# mail modules are imported by the functions that use them, and the configuration
+# (folders, infos.env, e-mail settings) is only resolved by get_config(), which the
+# daemon calls once at startup.
 
-# 1. Find the user's home directory (e.g., C:\Users\Username)
-user_home = os.path.expanduser('~')
-
-# 2. Directly target the "Documents" folder to create the application directory path
-APP_DIR = os.path.join(user_home, 'Documents', 'CameraDetection')
-
-# 3. Check if the application directory exists, create it if not.
-#    exist_ok=True prevents an error if the folder already exists.
-try:
-    os.makedirs(APP_DIR, exist_ok=True)
-    print(f"Application working directory: {APP_DIR}")
-except OSError as e:
-    # If the "Documents" folder cannot be found or there is a permission issue,
-    # create a fallback plan to prevent the program from crashing.
-    # Creates a 'data' folder next to the .exe.
-    print(f"ERROR: Could not access the 'Documents' folder ({e}). Data will be saved next to the program.")
+
+def get_application_path():
+    # When packaged as .exe, the folder of the .exe; otherwise the folder of this .py file
     if getattr(sys, 'frozen', False):
-        application_path = os.path.dirname(sys.executable)
-    else:
-        application_path = os.path.dirname(os.path.abspath(__file__))
-    APP_DIR = os.path.join(application_path, 'CameraDetectionData')
-    os.makedirs(APP_DIR, exist_ok=True)
-
-VIDEO_PATH = os.path.join(APP_DIR, "recording.avi")
-IMAGE_PATH = os.path.join(APP_DIR, "face.jpg")
-
-os.makedirs(APP_DIR, exist_ok=True)
-
-# Determine the main directory where the program is running
-# If running as an .exe, get the folder where the .exe is located.
-# If running as a .py, get the folder where the .py file is located.
-if getattr(sys, 'frozen', False):
-    # When packaged as .exe
-    application_path = os.path.dirname(sys.executable)
-else:
-    # When running as a normal .py script
-    application_path = os.path.dirname(os.path.abspath(__file__))
-
-# Create the full path to the .env file
-env_path = os.path.join(application_path, 'infos.env')
-
-# Check if the .env file exists (optional but recommended)
-if os.path.exists(env_path):
-    print(f"Loading .env file from: {env_path}")
-    load_dotenv(dotenv_path=env_path)
-else:
-    print(f"Error: infos.env file not found at {env_path}")
-    # You can stop the program here or continue with default settings
-    # For example: sys.exit("Configuration file infos.env not found!")
-# This code for finding the .env file should already be in your file
-if getattr(sys, 'frozen', False):
-    application_path = os.path.dirname(sys.executable)
-else:
-    application_path = os.path.dirname(os.path.abspath(__file__))
-
-# --- CHANGE 1: Video Recording Path ---
-# OLD (probably):
-# video_kayit_yolu = "recording.avi"
-# NEW and CORRECT:
-video_kayit_yolu = os.path.join(application_path, "recording.avi")
-# ... and use this path in cv2.VideoWriter
-
-# --- CHANGE 2: Face Image Save Path ---
-# OLD (probably):
-# resim_kayit_yolu = "face.jpg"
-# NEW and CORRECT:
-face_jpg_yolu = os.path.join(application_path, "face.jpg")
-# ... and use this path in cv2.imwrite
-# cv2.imwrite(face_jpg_yolu, face_frame)
-
-
-
-
-# Read values from environment variables
-FROM_EMAIL = os.getenv("FROM_EMAIL")
-PASSWORD = os.getenv("PASSWORD")  
-TO_EMAIL = os.getenv("TO_EMAIL")
-
-if not all([FROM_EMAIL, PASSWORD, TO_EMAIL]):
-    raise ValueError("Missing one or more required environment variables: FROM_EMAIL, PASSWORD, TO_EMAIL. Please check your infos.env file.")
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
 
-# ---- Motion Detection ----
-def record_on_motion(output_path="output.avi", threshold=20, min_motion_pixels=5000, inactivity_timeout=5.0):
- 
-    cap = cv2.VideoCapture(0)
-    # Check if the camera opened successfully
-    if not cap.isOpened():
-        print("Error: Cannot open camera.")
-        return
 
-    # Try to get frame dimensions for the video writer, retrying if necessary
-    max_retries = 10
-    for _ in range(max_retries):
-        ret, frame = cap.read()
-        if ret:
-            break
-        time.sleep(0.2)  # Wait a bit before retrying
-    if not ret:
-        print("Error: Cannot read frame from camera after several attempts.")
-        cap.release()
-        return
-    height, width, _ = frame.shape
+class Config:
+    """
+    Paths and settings of the program, read from infos.env and the environment.
+
+    Creating it creates the application folder (Documents/CameraDetection, or a folder next
+    to the program if Documents is not usable), loads infos.env and raises ValueError if
+    FROM_EMAIL, PASSWORD or TO_EMAIL are missing.
+    """
+
+    def __init__(self):
+        from dotenv import load_dotenv
 
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = None
-    is_recording = False
-    last_motion_time = None
+        from CameraSupervisor import parse_source
+        from MotionZones import load_zones
 
-    prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    prev_gray = cv2.GaussianBlur(prev_gray, (21, 21), 0) # Apply blur to reduce noise
+        self.application_path = get_application_path()
+
+        # Directly target the "Documents" folder of the user's home directory (e.g., C:\Users\Username)
+        self.app_dir = os.path.join(os.path.expanduser('~'), 'Documents', 'CameraDetection')
+        try:
+            # exist_ok=True prevents an error if the folder already exists
+            os.makedirs(self.app_dir, exist_ok=True)
+            print(f"Application working directory: {self.app_dir}")
+        except OSError as e:
+            # If the "Documents" folder cannot be found or there is a permission issue,
+            # create a 'data' folder next to the program instead of crashing.
+            print(f"ERROR: Could not access the 'Documents' folder ({e}). Data will be saved next to the program.")
+            self.app_dir = os.path.join(self.application_path, 'CameraDetectionData')
+            os.makedirs(self.app_dir, exist_ok=True)
+
+        self.video_path = os.path.join(self.app_dir, "recording.avi")
+        self.image_path = os.path.join(self.app_dir, "face.jpg")
+        # Every motion event gets its own clip(s) in clips_dir, listed in the clip_index_path database
+        self.clips_dir = os.path.join(self.app_dir, "clips")
+        self.clip_index_path = os.path.join(self.app_dir, "clips.sqlite3")
+        self.outbox_path = os.path.join(self.app_dir, "outbox.sqlite3")
+        # Picture sent by send_face_detected_email when it is given none, next to the program
+        self.face_image_path = os.path.join(self.application_path, "face.jpg")
+
+        env_path = os.path.join(self.application_path, 'infos.env')
+        if os.path.exists(env_path):
+            print(f"Loading .env file from: {env_path}")
+            load_dotenv(dotenv_path=env_path)
+        else:
+            print(f"Error: infos.env file not found at {env_path}")
+
+        # Read values from environment variables
+        self.from_email = os.getenv("FROM_EMAIL")
+        self.password = os.getenv("PASSWORD")
+        self.to_email = os.getenv("TO_EMAIL")
+        if not all([self.from_email, self.password, self.to_email]):
+            raise ValueError("Missing one or more required environment variables: FROM_EMAIL, PASSWORD, TO_EMAIL. Please check your infos.env file.")
+
+        # Comma-separated camera indices, video files or stream URLs (default: the first camera).
+        # With more than one source every camera runs in its own worker process.
+        self.camera_sources = [parse_source(source) for source in os.getenv("CAMERA_SOURCES", "0").split(",") if source.strip()]
+
+        # Stage timings and counters are served on http://127.0.0.1:METRICS_PORT/metrics (0 turns it off)
+        self.metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+
+        # Tile grid and ignore/weighted zones for motion, e.g. to leave out a plant or a window
+        # (JSON, see MotionZones.load_zones). Without the file the whole frame counts the same.
+        self.motion_zones_path = os.getenv("MOTION_ZONES", os.path.join(self.app_dir, "motion_zones.json"))
+        motion_grid, motion_zones = load_zones(self.motion_zones_path)
+        self.motion_options = {"motion_zones": motion_zones}
+        if motion_grid is not None:
+            self.motion_options["motion_grid"] = motion_grid
+
+
+_config = None
+
+def get_config():
+    # Resolved on first use and then kept; the daemon resolves it before anything else
+    global _config
+    if _config is None:
+        _config = Config()
+    return _config
+
+# ---- Motion Detection ----
+def record_on_motion(output_path="output.avi", source=0, threshold=20, min_motion_pixels=5000, inactivity_timeout=5.0,
+                     queue_size=32, drop_policy="drop_oldest", pre_roll_seconds=2.0,
+                     detection_scale="full", background_model="frame_diff",
+                     face_worker=None, segment_dir=None, max_segment_seconds=300.0, clip_index=None,
+                     async_writer=True, idle_fps=2.0, pre_trigger=0.5, hysteresis=5.0, motion_grid=(16, 12),
+                     motion_zones=None):
+    # Opens the camera (source: device index, video file or stream URL), records a single
+    # motion event and closes the camera again.
+    # With segment_dir every event is written to its own timestamped file there (long events
+    # roll over to a new part every max_segment_seconds) instead of overwriting output_path.
+    # Finished clips are recorded in clip_index when one is given.
+    # While nothing moves only idle_fps frames per second are analysed; pre_trigger (a share of
+    # min_motion_pixels) switches to the full rate, hysteresis seconds of calm switch back.
+    # Changed pixels are counted per tile of motion_grid; motion_zones can ignore or weigh parts
+    # of the frame and give them their own threshold (see MotionZones.TileMotionMap).
+    # The daemon in main() uses MotionRecorder directly to keep the camera open between events.
+    import cv2
+
+    from MotionRecorder import MotionRecorder
+
+    recorder = MotionRecorder(
+        source=source, output_path=output_path, threshold=threshold, min_motion_pixels=min_motion_pixels,
+        inactivity_timeout=inactivity_timeout, queue_size=queue_size, drop_policy=drop_policy,
+        pre_roll_seconds=pre_roll_seconds, detection_scale=detection_scale, background_model=background_model,
+        segment_dir=segment_dir, max_segment_seconds=max_segment_seconds, clip_index=clip_index,
+        async_writer=async_writer, idle_fps=idle_fps, pre_trigger=pre_trigger, hysteresis=hysteresis,
+        motion_grid=motion_grid, motion_zones=motion_zones)
+    if not recorder.open():
+        return
 
     print("Ready to detect motion. Press 'q' to quit.")
+    is_recording = recorder.record_event(face_worker=face_worker)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-
-        # Compute the difference between the current and previous frame
-        frame_delta = cv2.absdiff(prev_gray, gray)
-        thresh = cv2.threshold(frame_delta, threshold, 255, cv2.THRESH_BINARY)[1]
-        
-        # Count the number of white pixels (indicating change)
-        motion_pixel_count = np.count_nonzero(thresh)
-
-        motion_detected = motion_pixel_count > min_motion_pixels
-
-        if motion_detected:
-            if not is_recording:
-                # Start recording when motion is first detected
-                print("Motion detected! Starting recording...")
-                is_recording = True
-                out = cv2.VideoWriter(output_path, fourcc, 20.0, (width, height))
-            
-            last_motion_time = time.time()
-
-        if is_recording:
-            # Write the frame to the file while recording
-            out.write(frame)
-
-            # Check if motion has stopped for the timeout duration
-            if time.time() - last_motion_time > inactivity_timeout:
-                print(f"Motion stopped. Finishing recording after {inactivity_timeout} seconds of inactivity.")
-                break # Exit the loop to save the video
-
-        prev_gray = gray
     # Cleanup
-    if is_recording:
-        out.release()
-    cap.release()
+    recorder.close()
     cv2.destroyAllWindows()
-    print(f"Video saved to {output_path}" if is_recording else "No motion was recorded.")
     return is_recording # Return whether a video was actually created
 
 def capture_frame_from_video(video_path='recording.avi', output_image='face.jpg'):
+    # Saves the first frame of video_path as output_image; needs no configuration
+    import cv2
+
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"Error: Cannot open video file {video_path}")
@@ -174,7 +144,7 @@ def capture_frame_from_video(video_path='recording.avi', output_image='face.jpg'
 
     ret, frame = cap.read()
     if ret:
-        cv2.imwrite(face_jpg_yolu, frame)
+        cv2.imwrite(output_image, frame)
         print(f"Frame saved as {output_image}")
         cap.release()
         return True
@@ -184,42 +154,106 @@ def capture_frame_from_video(video_path='recording.avi', output_image='face.jpg'
         return False
 
 # ---- Face Detection ----
-def faceDetect(video_path=VIDEO_PATH):
-    cap = cv2.VideoCapture(video_path)
-    face_found = False
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 5)
-        if len(faces) > 0:
-            face_found = True
-            break
-    cap.release()
-    return face_found
+def faceDetect(video_path, stride=1, stride_seconds=None, coarse_to_fine=False, workers=1):
+    # Scans a saved clip, e.g. get_config().video_path; the path is passed in so tools and
+    # benchmarks can call this without loading the configuration
+    from FaceDetection import parallel_scan_video, scan_video
+
+    if workers != 1:
+        # Long clips: scan frame ranges in separate processes
+        face_found, frame_index, box = parallel_scan_video(video_path, workers=workers)
+        if face_found:
+            print(f"Face found at frame {frame_index}: {box}")
+        return face_found
+
+    # stride/stride_seconds skip frames without decoding them, coarse_to_fine checks neighbours of a hit
+    result = scan_video(video_path, stride=stride, stride_seconds=stride_seconds, coarse_to_fine=coarse_to_fine)
+    print(f"Face scan: {result['frames_decoded']} frames decoded, {result['frames_scanned']} scanned, "
+          f"{result['frames_grabbed']} skipped.")
+    return result["face_found"]
 
 # ---- Email ----
-from MailPhotoSender import MailPhotoSender
-
-def send_face_detected_email(image_path=face_jpg_yolu):
-   
-    sender = MailPhotoSender(
-        from_email=FROM_EMAIL,
-        password=PASSWORD,
-        smtp_server="smtp.gmail.com",
-        smtp_port=587
-    )
+# Size budget for the attached picture
+ALERT_IMAGE_MAX_BYTES = 200_000
+
+# Alerts closer together than ALERT_WINDOW seconds go out as one e-mail
+ALERT_WINDOW = 30.0
+ALERT_MAX_DELAY = 120.0
+ALERT_MAX_BATCH = 6
+
+_mail_pool = None
+_alert_outbox = None
+_alert_coalescer = None
+
+def get_mail_pool():
+    # One pool for the whole program, so alerts reuse the logged-in SMTP session
+    global _mail_pool
+    if _mail_pool is None:
+        from MailSessionPool import MailSessionPool
+
+        config = get_config()
+        _mail_pool = MailSessionPool("smtp.gmail.com", 587, config.from_email, config.password)
+    return _mail_pool
+
+def get_alert_outbox():
+    # Alerts are sent by a background worker and kept on disk until they went out
+    global _alert_outbox, _alert_coalescer
+    if _alert_outbox is None:
+        from AlertOutbox import AlertCoalescer, AlertOutbox
+        from MailPhotoSender import MailPhotoSender
+
+        config = get_config()
+        sender = MailPhotoSender(
+            from_email=config.from_email,
+            password=config.password,
+            smtp_server="smtp.gmail.com",
+            smtp_port=587,
+            pool=get_mail_pool()
+        )
+        _alert_outbox = AlertOutbox(config.outbox_path, sender)
+        # Face alerts close in time are merged when sent. The coalescer is registered before
+        # the worker starts, so alerts held back when the program last stopped go out merged too
+        _alert_coalescer = AlertCoalescer(_alert_outbox, config.to_email, window=ALERT_WINDOW,
+                                          max_delay=ALERT_MAX_DELAY, max_batch=ALERT_MAX_BATCH).start()
+        _alert_outbox.start()
+        pending = _alert_outbox.pending_count()
+        if pending:
+            print(f"{pending} alert(s) left from the last run will be sent.")
+    return _alert_outbox
+
+def get_alert_coalescer():
+    # Created and started together with the outbox
+    get_alert_outbox()
+    return _alert_coalescer
+
+def send_face_detected_email(image_path=None, image_data=None, frame=None, camera=None, face_box=None):
+    # Only spools the alert: close events are merged into one e-mail when the outbox worker sends them.
+    # A frame is cropped to face_box (plus a margin) when one is given
     subject = "Test Email with Image"
+    if camera is not None:
+        subject = f"Face detected on camera {camera}"
     body = "This is a test email with an attached image."
     #image_path = r"C:\Users\esma-\dev\CameraDetection\face.jpg"
 
-    sender.send_mail_with_image(subject=subject, body=body, to_email=TO_EMAIL , image_path=image_path)
+    if frame is not None:
+        from MailPhotoSender import encode_image
+
+        # Encoded in memory and kept under the size budget
+        image_data = encode_image(frame, max_bytes=ALERT_IMAGE_MAX_BYTES, face_box=face_box)
+    elif image_data is None:
+        if image_path is None:
+            image_path = get_config().face_image_path
+        if not os.path.exists(image_path):
+            print(f"Error: Cannot send alert, image file not found: {image_path}")
+            return
+        with open(image_path, 'rb') as img:
+            image_data = img.read()
+    get_alert_coalescer().add(subject, body, image_data, camera=camera)
 
 # ---- Cross-platform Autostart Setup ----
 def setup_autostart():
+    import platform
+
     system = platform.system()
     script_path = os.path.abspath(__file__)
 
@@ -280,9 +314,13 @@ Comment=Start on login
 # ---- Main ----
 
 def is_screen_locked():
+    import platform
+
     system = platform.system()
     if system == "Windows":
         try:
+            import ctypes
+
             user32 = ctypes.windll.User32
             # 0 = unlocked, 1 = locked
             return user32.GetForegroundWindow() == 0
@@ -291,6 +329,8 @@ def is_screen_locked():
     elif system == "Darwin":
         # macOS: check for loginwindow process in front
         try:
+            import subprocess
+
             front_app = subprocess.check_output(
                 ["osascript", "-e", 'tell application "System Events" to get name of first process whose frontmost is true']
             ).decode().strip()
@@ -300,39 +340,121 @@ def is_screen_locked():
     elif system == "Linux":
         # Linux: check for screensaver/locker process
         try:
+            import subprocess
+
             output = subprocess.check_output("loginctl show-session $(loginctl | awk '/tty/ {print $1}') -p LockedHint", shell=True)
             return b"yes" in output
         except Exception:
             return False
     return False
 
-if __name__ == "__main__":
+def main():
+    import platform
+
+    from CameraSupervisor import CameraSupervisor
+    from ClipIndex import ClipIndex
+    from FaceDetection import FaceScanWorker, get_detector_pool
+    from LockMonitor import ScreenLockMonitor
+    from Metrics import REGISTRY, start_metrics_server
+    from MotionRecorder import MotionRecorder
+
+    # Folders, infos.env and the environment are read once, here
+    config = get_config()
     setup_autostart()  # Adds auto-run on startup (first run only)
+    # Load the face detectors now, in the background, instead of on the first lock event
+    get_detector_pool().warm_up(size=2)
+    # Start sending alerts that were still pending when the program last stopped, merging
+    # the face alerts that were held back
+    get_alert_coalescer()
     system = platform.system()
     print(f"Detected OS: {system}")
+    if config.metrics_port:
+        try:
+            start_metrics_server(config.metrics_port)
+            print(f"Metrics available at http://127.0.0.1:{config.metrics_port}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint could not be started: {e}")
+
+    clip_index = ClipIndex(config.clip_index_path)
+    # Lock/unlock transitions come from one long-lived watcher (on Linux) instead of
+    # starting a loginctl shell pipeline on every poll
+    lock_monitor = ScreenLockMonitor(poll_function=is_screen_locked).start()
+
+    if len(config.camera_sources) > 1:
+        # One worker process per camera; they stay open and are only armed while the screen is locked
+        supervisor = CameraSupervisor(
+            config.camera_sources, recorder_options=config.motion_options, segment_dir=config.clips_dir,
+            clip_index_path=config.clip_index_path,
+            on_alert=lambda name, image_data: send_face_detected_email(image_data=image_data, camera=name),
+            alert_max_bytes=ALERT_IMAGE_MAX_BYTES,
+        )
+        # Subscribed before the workers start and given the current state at once, so a lock
+        # or unlock in between can't leave the cameras in the wrong state
+        lock_monitor.subscribe(lambda locked: supervisor.arm() if locked else supervisor.disarm(), replay=True)
+        supervisor.start(armed=False)  # The subscription has already set the armed state
+        REGISTRY.add_collector(supervisor.metrics)
+        print(f"Supervising {len(config.camera_sources)} cameras.")
+        while True:
+            time.sleep(60)
+            for name, stats in supervisor.stats().items():
+                print(f"Camera {name}: {stats['state']}, {stats['events']} events, {stats['face_events']} with a face, "
+                      f"{stats['frames_dropped']} frames dropped, "
+                      f"{stats['restarts']} restarts.")
+
+    # Set while the screen is unlocked, so a recorder waiting for motion gives up right away.
+    # Only the subscription changes it, starting from the current state, so an unlock right
+    # after a lock can't be lost
+    disarmed = threading.Event()
+    lock_monitor.subscribe(lambda locked: disarmed.clear() if locked else disarmed.set(), replay=True)
 
     def main_loop():
-        camera_active = False
+        # The camera is opened on the first lock and then kept open; while unlocked it is only paused
+        recorder = None
         while True:
-            if is_screen_locked():
-                if not camera_active:
-                    print("Screen locked. Starting motion detection.")
-                    time.sleep(5)  # Wait a bit before starting detection
-                    # Start motion detection and face capture
-                    camera_active = True
-                    if record_on_motion(VIDEO_PATH):
-                        if faceDetect(VIDEO_PATH):
-                            if capture_frame_from_video(VIDEO_PATH, IMAGE_PATH):
-                                send_face_detected_email()
-                # Stay in this state until unlocked
-                while is_screen_locked():
-                    time.sleep(0.1)
-                print("Screen unlocked. Waiting for next lock event.")
-                camera_active = False
-            time.sleep(0.5)  # Poll for lock status
+            lock_monitor.wait_for(True)
+            print("Screen locked. Starting motion detection.")
+            time.sleep(5)  # Wait a bit before starting detection
+            if recorder is None:
+                recorder = MotionRecorder(source=0, output_path=config.video_path, segment_dir=config.clips_dir,
+                                          clip_index=clip_index, **config.motion_options)
+                if not recorder.open():
+                    recorder = None
+            else:
+                recorder.resume()
+
+            # Record every motion event while the screen stays locked, each into its own clip
+            while recorder is not None and lock_monitor.is_locked():
+                # Faces are searched in the live frames while recording, not in the saved clip
+                face_worker = FaceScanWorker().start()
+                try:
+                    recorded = recorder.record_event(face_worker=face_worker, stop_event=disarmed)
+                except Exception as e:
+                    # A failed event must not end the monitoring thread; the next one may work
+                    print(f"Error while recording: {e}")
+                    recorded = False
+                    time.sleep(1)
+                face_found = face_worker.finish()
+                if face_found and recorded:
+                    print(f"Face detector metrics: {get_detector_pool().metrics()}")
+                    # Best face frame of the event, cropped to the face and encoded in memory
+                    send_face_detected_email(frame=face_worker.face_frame, face_box=face_worker.face_box)
+                if not recorded and recorder.camera_ended():
+                    # Camera stopped delivering frames, open it again on the next lock
+                    recorder.close()
+                    recorder = None
+
+            if recorder is not None:
+                recorder.pause()
+            # Stay in this state until unlocked
+            lock_monitor.wait_for(False)
+            print("Screen unlocked. Waiting for next lock event.")
 
     t = threading.Thread(target=main_loop, daemon=True)
     t.start()
     # Keep main thread alive
     while True:
-        time.sleep(5)
\ No newline at end of file
+        time.sleep(5)
+
+
+if __name__ == "__main__":
+    main()
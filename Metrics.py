@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from a fast cvtColor up to a slow SMTP send
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """Returns the child for one label combination. Keep it around on hot paths."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        # (suffix, labels, value) for every child
+        raise NotImplementedError
+
+    def collect(self):
+        """(name, type, help, [(suffix, labels_dict, value), ...]) with the current values."""
+        return self.name, self.type_name, self.help_text, list(self._samples())
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. frames dropped or alerts sent."""
+
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _samples(self):
+        for key, child in sorted(self._children.items()):
+            yield "", dict(zip(self.labelnames, key)), child.value
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the seconds spent in the block."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    """
+    Distribution of durations in fixed buckets. Observing is a bisect and three
+    additions under a lock, cheap enough for every frame.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _samples(self):
+        for key, child in sorted(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield "_bucket", dict(labels, le=_format_value(float(bound))), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+class MetricsRegistry:
+    """
+    The metrics of this process, rendered in the Prometheus text format.
+
+    Collectors are functions returning extra samples computed at scrape time, as a
+    list of (name, type, help, [(suffix, labels_dict, value), ...]), e.g. suffix "" for a
+    counter and "_bucket", "_sum" and "_count" for a histogram. Samples of a collector
+    with the same name as a metric of the registry are rendered as part of that metric.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        """Current samples of this registry's own metrics, in the collector format."""
+        return [metric.collect() for metric in list(self._metrics.values())]
+
+    def render(self):
+        families = {}
+        for collected in [self.collect()] + [collector() for collector in list(self._collectors)]:
+            for name, type_name, help_text, samples in collected:
+                family = families.setdefault(name, (type_name, help_text, []))
+                family[2].extend(samples)
+        parts = []
+        for name, (type_name, help_text, samples) in families.items():
+            lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {type_name}"]
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+            parts.append("\n".join(lines))
+        return "\n".join(parts) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline metrics, shared by all modules of this process
+STAGE_SECONDS = REGISTRY.histogram(
+    "camera_stage_seconds", "Time spent per frame (or per call) in each pipeline stage.", ["stage"])
+FRAMES_CAPTURED = REGISTRY.counter("camera_frames_captured_total", "Frames read from the camera.")
+FRAMES_SKIPPED = REGISTRY.counter("camera_frames_skipped_total", "Frames grabbed but not decoded at the idle rate.")
+FRAMES_DROPPED = REGISTRY.counter("camera_frames_dropped_total", "Frames dropped because the consumer fell behind.")
+MOTION_EVENTS = REGISTRY.counter("camera_motion_events_total", "Motion events recorded.")
+FACE_EVENTS = REGISTRY.counter("camera_face_events_total", "Recorded events in which a face was found.")
+ALERTS_SENT = REGISTRY.counter("camera_alerts_sent_total", "Alert e-mails sent.")
+ALERTS_FAILED = REGISTRY.counter("camera_alerts_failed_total", "Failed attempts to send an alert e-mail.")
+
+
+def stage_timer(stage):
+    """Histogram child for one stage, e.g. stage_timer("cvtColor").observe(seconds)."""
+    return STAGE_SECONDS.labels(stage=stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def start_metrics_server(port=9108, host="127.0.0.1", registry=REGISTRY):
+    """Serves the registry on http://host:port/metrics from a background thread."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,117 @@
+import time
+
+import cv2
+import numpy as np
+
+from Metrics import stage_timer
+
+# Named detection resolutions and how many pyramid steps (each halves the size) they take
+DETECTION_SCALES = {"full": 0, "half": 1, "quarter": 2}
+
+_cvt_seconds = stage_timer("cvtColor")
+_resize_seconds = stage_timer("resize")
+_blur_seconds = stage_timer("blur")
+
+
+class DetectionScaler:
+    """
+    Turns full-resolution camera frames into the smaller blurred grayscale frames used
+    for motion analysis, while the recording keeps the original frames.
+
+    Args:
+        frame_shape (tuple): Shape of the camera frames, e.g. (1080, 1920, 3).
+        detection_scale (str or int): "full", "half", "quarter", or a fixed width in pixels.
+        blur_size (int): Gaussian kernel size at full resolution. It is scaled down
+            together with the frame so the smoothing covers the same area of the scene.
+
+    The intermediate images (grayscale, pyramid levels, resized) are allocated once here
+    and reused for every frame.
+    """
+
+    def __init__(self, frame_shape, detection_scale="full", blur_size=21):
+        full_height, full_width = frame_shape[:2]
+        self.full_size = (full_width, full_height)
+        self.levels, self.resize_to = self._plan(full_width, full_height, detection_scale)
+
+        if self.resize_to is not None:
+            width, height = self.resize_to
+        else:
+            width, height = full_width, full_height
+            for _ in range(self.levels):
+                # pyrDown rounds odd sizes up
+                width, height = (width + 1) // 2, (height + 1) // 2
+        self.size = (width, height)
+
+        # How many full-resolution pixels one detection pixel stands for, per axis
+        self.scale_x = full_width / width
+        self.scale_y = full_height / height
+        self.pixel_ratio = (width * height) / (full_width * full_height)
+
+        kernel = int(round(blur_size / self.scale_x))
+        if kernel % 2 == 0:
+            kernel += 1
+        self.blur_kernel = (max(kernel, 3), max(kernel, 3))
+
+        # Working buffers for prepare()
+        self._gray = np.empty((full_height, full_width), dtype=np.uint8)
+        self._levels = []
+        width, height = full_width, full_height
+        for _ in range(self.levels):
+            width, height = (width + 1) // 2, (height + 1) // 2
+            self._levels.append(np.empty((height, width), dtype=np.uint8))
+        self._resized = None
+        if self.resize_to is not None:
+            self._resized = np.empty((self.resize_to[1], self.resize_to[0]), dtype=np.uint8)
+
+    @staticmethod
+    def _plan(full_width, full_height, detection_scale):
+        if isinstance(detection_scale, str):
+            if detection_scale not in DETECTION_SCALES:
+                raise ValueError(f"Unknown detection scale: {detection_scale}. Use one of {list(DETECTION_SCALES)} or a width in pixels.")
+            return DETECTION_SCALES[detection_scale], None
+
+        target_width = int(detection_scale)
+        if target_width <= 0:
+            raise ValueError("Detection width must be a positive number of pixels.")
+        if target_width >= full_width:
+            return 0, None
+
+        # Halve with pyrDown while we stay above the target, then resize the rest of the way
+        levels = 0
+        width = full_width
+        while (width + 1) // 2 >= target_width:
+            width = (width + 1) // 2
+            levels += 1
+        if width == target_width:
+            return levels, None
+        target_height = max(1, int(round(full_height * target_width / full_width)))
+        return levels, (target_width, target_height)
+
+    def scale_min_pixels(self, min_motion_pixels):
+        """Converts a changed-pixel threshold given at full resolution to detection resolution."""
+        return max(1, int(round(min_motion_pixels * self.pixel_ratio)))
+
+    def empty_output(self):
+        """A buffer of the detection size, to pass to prepare() as dst."""
+        return np.empty((self.size[1], self.size[0]), dtype=np.uint8)
+
+    def prepare(self, frame, dst=None):
+        """
+        Returns the blurred grayscale detection frame for a full-resolution BGR frame.
+        With dst (see empty_output()) the result is written there instead of a new array.
+        """
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        now = time.perf_counter()
+        _cvt_seconds.observe(now - start)
+        if self.levels or self.resize_to is not None:
+            start = now
+            for level in self._levels:
+                gray = cv2.pyrDown(gray, dst=level)
+            if self.resize_to is not None:
+                gray = cv2.resize(gray, self.resize_to, dst=self._resized, interpolation=cv2.INTER_AREA)
+            now = time.perf_counter()
+            _resize_seconds.observe(now - start)
+        blurred = cv2.GaussianBlur(gray, self.blur_kernel, 0, dst=dst)
+        _blur_seconds.observe(time.perf_counter() - now)
+        return blurred
@@ -0,0 +1,355 @@
+import os
+import time
+
+import cv2
+
+from AsyncVideoWriter import AsyncVideoWriter, VideoWriterError
+from BackgroundModel import create_background_model
+from CaptureScheduler import CaptureScheduler
+from FrameGrabber import STREAM_CLOCK, WALL_CLOCK, FrameGrabber
+from Metrics import MOTION_EVENTS, stage_timer
+from MotionDetection import DetectionScaler
+from MotionZones import TileMotionMap
+from PreRollBuffer import PreRollBuffer
+
+_write_seconds = stage_timer("write")
+
+# Frame rates outside this range are measurement glitches or bogus camera reports
+MIN_WRITER_FPS = 1.0
+MAX_WRITER_FPS = 60.0
+DEFAULT_FPS = 20.0
+
+# What a failing writer raises: the threaded one wraps its error, cv2.VideoWriter raises its own
+WRITER_ERRORS = (VideoWriterError, cv2.error)
+
+
+class MotionRecorder:
+    """
+    Keeps a camera open and records any number of motion events back to back.
+
+    open() starts the camera once; record_event() waits for motion, records one event and
+    returns, leaving the camera running for the next one. pause() and resume() stop and
+    restart reading frames without releasing the device, so disarming costs no CPU and
+    re-arming doesn't pay for opening the camera again.
+
+    Args:
+        source (int or str): Camera index, video file or stream URL for cv2.VideoCapture.
+        output_path (str): File used for each event when segment_dir is not given.
+        threshold (int): Minimum pixel difference that counts as change.
+        min_motion_pixels (int): Changed pixels (at full resolution) that count as motion.
+        inactivity_timeout (float): Seconds without motion that end an event.
+        queue_size (int): Frames buffered between the capture thread and the motion loop.
+        drop_policy (str): "drop_oldest" or "block", see FrameGrabber.
+        pre_roll_seconds (float): Seconds of video kept from before the trigger.
+        detection_scale (str or int): "full", "half", "quarter" or a width in pixels.
+        background_model (str): "frame_diff", "running_average", "mog2" or "knn".
+        segment_dir (str): If given, every event is written to its own timestamped file here.
+        max_segment_seconds (float): Long events roll over to a new part after this long.
+        clip_index (ClipIndex): Records every finished clip.
+        async_writer (bool): Encode on a separate thread.
+        camera_name (str): Prefixed to the event ids, so clips of several cameras don't collide.
+        idle_fps (float): Frames per second analysed while nothing moves (None analyses every frame).
+        pre_trigger (float): Share of min_motion_pixels that already switches to the full frame rate.
+        hysteresis (float): Seconds of calm before going back to idle_fps.
+        motion_grid (tuple): (columns, rows) of the tile grid motion is counted in.
+        motion_zones (list): Ignore zones, weights and per-zone thresholds, see TileMotionMap.
+    """
+
+    def __init__(self, source=0, output_path="output.avi", threshold=20, min_motion_pixels=5000,
+                 inactivity_timeout=5.0, queue_size=32, drop_policy="drop_oldest", pre_roll_seconds=2.0,
+                 detection_scale="full", background_model="frame_diff", segment_dir=None,
+                 max_segment_seconds=300.0, clip_index=None, async_writer=True, camera_name=None,
+                 idle_fps=2.0, pre_trigger=0.5, hysteresis=5.0, motion_grid=(16, 12), motion_zones=None):
+        self.source = source
+        self.output_path = output_path
+        self.threshold = threshold
+        self.min_motion_pixels = min_motion_pixels
+        self.inactivity_timeout = inactivity_timeout
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.pre_roll_seconds = pre_roll_seconds
+        self.detection_scale = detection_scale
+        self.background_model = background_model
+        self.segment_dir = segment_dir
+        self.max_segment_seconds = max_segment_seconds
+        self.clip_index = clip_index
+        self.async_writer = async_writer
+        self.camera_name = camera_name
+        self.motion_grid = motion_grid
+        self.motion_zones = motion_zones
+        self.scheduler = CaptureScheduler(idle_fps, pre_trigger, hysteresis) if idle_fps else None
+
+        self.cap = None
+        self.grabber = None
+        self.events_recorded = 0
+        self.fourcc = cv2.VideoWriter_fourcc(*'XVID')
+
+    def open(self):
+        """Opens the camera and prepares detection. Returns False if the camera is not usable."""
+        self.cap = cv2.VideoCapture(self.source)
+        # Check if the camera opened successfully
+        if not self.cap.isOpened():
+            print(f"Error: Cannot open camera {self.source}.")
+            return False
+
+        # Try to get frame dimensions for the video writer, retrying if necessary
+        max_retries = 10
+        for _ in range(max_retries):
+            ret, frame = self.cap.read()
+            if ret:
+                break
+            time.sleep(0.2)  # Wait a bit before retrying
+        if not ret:
+            print("Error: Cannot read frame from camera after several attempts.")
+            self.cap.release()
+            return False
+        self.height, self.width, _ = frame.shape
+
+        # Keep the last few seconds in memory so the clip also shows what happened before the trigger
+        # Until the real capture rate has been measured, trust the camera (or assume 20 fps)
+        reported_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.camera_fps = reported_fps if MIN_WRITER_FPS <= reported_fps <= MAX_WRITER_FPS else DEFAULT_FPS
+        self.pre_roll = None
+        if self.pre_roll_seconds > 0:
+            self.pre_roll = PreRollBuffer(self.pre_roll_seconds, self.camera_fps, frame.shape)
+            print(f"Pre-roll buffer: {self.pre_roll.capacity} frames ({self.pre_roll.nbytes / 1e6:.1f} MB)")
+
+        # Motion is analysed on a smaller blurred grayscale copy, the writer still gets full frames
+        self.scaler = DetectionScaler(frame.shape, self.detection_scale)
+        self.min_detection_pixels = self.scaler.scale_min_pixels(self.min_motion_pixels)
+        self.detection_pixels = self.scaler.size[0] * self.scaler.size[1]
+        if self.scaler.size != (self.width, self.height):
+            print(f"Detecting motion at {self.scaler.size[0]}x{self.scaler.size[1]} (min {self.min_detection_pixels} changed pixels)")
+
+        # Changed pixels are counted per tile, so zones can be ignored, weighted or given their own threshold
+        self.tile_map = TileMotionMap(self.scaler, self.min_motion_pixels, self.motion_grid, self.motion_zones)
+
+        # frame_diff compares with the previous frame, running_average/mog2/knn with a learned background
+        self.model = create_background_model(self.background_model, self.threshold)
+        self.model.apply(self.scaler.prepare(frame)) # Apply blur to reduce noise
+        # Detection frames alternate between two buffers: frame_diff keeps the previous one
+        self._detection_buffers = [self.scaler.empty_output(), self.scaler.empty_output()]
+        self._current_buffer = 0
+
+        if self.segment_dir is not None:
+            os.makedirs(self.segment_dir, exist_ok=True)
+
+        # Frames are read on a separate thread so slow processing or disk writes don't stall the camera
+        # At the idle rate most frames are only grabbed, not decoded. Frames are decoded
+        # into recycled buffers, so anything kept past the next read must be copied.
+        # Files and streams decode faster than real time, so their frames are timed by their
+        # position in the stream; by the wall clock idle sampling would skip nearly all of them
+        clock = WALL_CLOCK if isinstance(self.source, int) else STREAM_CLOCK
+        self.grabber = FrameGrabber(self.cap, max_queue=self.queue_size, drop_policy=self.drop_policy,
+                                    scheduler=self.scheduler, reuse_buffers=True, clock=clock).start()
+        return True
+
+    def pause(self):
+        """Stops reading frames but keeps the device open."""
+        if self.grabber is not None:
+            self.grabber.pause()
+
+    def resume(self):
+        """Starts reading frames again. The scene may have changed, so detection starts over."""
+        if self.grabber is not None:
+            self.model.reset()
+            if self.scheduler is not None:
+                self.scheduler.reset()
+            if self.pre_roll is not None:
+                self.pre_roll.clear()
+            self.grabber.resume()
+
+    def writer_fps(self):
+        """
+        Frame rate for the recordings: the rate the camera was measured at, not a fixed 20.
+        A measurement outside 1-60 fps falls back to the rate the camera reports.
+        """
+        measured = self.grabber.capture_fps() if self.grabber is not None else None
+        if measured and MIN_WRITER_FPS <= measured <= MAX_WRITER_FPS:
+            return round(measured, 2)
+        return self.camera_fps
+
+    def _open_segment(self, event_id, start_time, part):
+        if self.segment_dir is None:
+            path = self.output_path
+        else:
+            name = f"event_{event_id}"
+            path = os.path.join(self.segment_dir, f"{name}.avi" if part == 0 else f"{name}_part{part}.avi")
+        fps = self.writer_fps()
+        writer = self._create_writer(path, fps)
+        if not writer.isOpened() and fps != self.camera_fps:
+            # E.g. a measured rate the codec can't store; the camera's own rate usually works
+            print(f"Error: Cannot open video writer for {path} at {fps} fps, retrying at {self.camera_fps} fps.")
+            writer.release()
+            fps = self.camera_fps
+            writer = self._create_writer(path, fps)
+        if not writer.isOpened():
+            writer.release()
+            raise VideoWriterError(f"Cannot open video writer for {path}.")
+        return {"path": path, "part": part, "start_time": start_time, "frame_count": 0, "peak_motion": 0.0,
+                "fps": fps, "writer": writer}
+
+    def _create_writer(self, path, fps):
+        if self.async_writer:
+            # Encoding runs on its own thread, overlapping with capture and detection.
+            # It copies the frames into its own recycled buffers, since ours are reused
+            return AsyncVideoWriter(path, self.fourcc, fps, (self.width, self.height), copy=True)
+        return cv2.VideoWriter(path, self.fourcc, fps, (self.width, self.height))
+
+    def _close_segment(self, event_id, segment, end_time):
+        writer = segment["writer"]
+        writer.release()
+        if self.async_writer:
+            print(f"Writer: {writer.encode_fps():.1f} fps encode, max backlog {writer.max_backlog} frames, "
+                  f"waited {writer.write_waits} times.")
+        if self.clip_index is not None:
+            self.clip_index.add_clip(event_id, segment["path"], segment["start_time"], end_time,
+                                     segment["frame_count"], segment["peak_motion"])
+
+    def _abandon_segment(self, segment, error):
+        # The file may be cut short or unreadable, so it is left as it is but not indexed
+        print(f"Error: {error} Motion event not recorded.")
+        if segment is not None:
+            try:
+                segment["writer"].release()
+            except WRITER_ERRORS:
+                pass
+
+    def record_event(self, face_worker=None, stop_event=None):
+        """
+        Waits for motion and records one event.
+
+        Args:
+            face_worker (FaceScanWorker): Gets the recorded frames for the live face scan.
+            stop_event (threading.Event): When set, stop waiting (or finish the current event).
+
+        Returns:
+            bool: True if an event was recorded, False if stopped or the camera ended first, or
+            if the recording could not be written (see camera_ended()).
+        """
+        is_recording = False
+        last_motion_time = None
+        last_frame_time = None
+        event_id = None
+        segment = None
+        saved_paths = []
+
+        while stop_event is None or not stop_event.is_set():
+            ret, frame, frame_time = self.grabber.read(stop_event=stop_event)
+            if not ret:
+                break
+            last_frame_time = frame_time
+
+            gray = self.scaler.prepare(frame, dst=self._detection_buffers[self._current_buffer])
+            self._current_buffer ^= 1
+
+            # Mark the pixels that differ from the background
+            thresh = self.model.apply(gray)
+
+            # Count the white pixels (indicating change) per tile and weigh them by zone
+            decision = self.tile_map.apply(thresh)
+            if self.scheduler is not None:
+                # Close to the threshold already switches to the full rate, so the event starts sharp
+                self.scheduler.update(decision.score, frame_time, recording=is_recording)
+
+            if decision.detected:
+                if not is_recording:
+                    # Start recording when motion is first detected
+                    print("Motion detected! Starting recording...")
+                    is_recording = True
+                    start_time = frame_time
+                    if self.pre_roll is not None and len(self.pre_roll) > 0:
+                        # Idle frames are sparse, so the buffer may reach further back than wanted
+                        start_time = max(self.pre_roll.oldest_timestamp(), frame_time - self.pre_roll_seconds)
+                    event_id = time.strftime("%Y%m%d_%H%M%S", time.localtime(start_time))
+                    if self.camera_name is not None:
+                        event_id = f"{self.camera_name}_{event_id}"
+                    try:
+                        segment = self._open_segment(event_id, start_time, 0)
+                        if self.pre_roll is not None:
+                            segment["frame_count"] += self.pre_roll.drain(
+                                segment["writer"], fps=segment["fps"],
+                                since=frame_time - self.pre_roll_seconds, until=frame_time)
+                    except WRITER_ERRORS as e:
+                        self._abandon_segment(segment, e)
+                        return False
+
+                last_motion_time = frame_time
+
+            if is_recording:
+                if self.segment_dir is not None and frame_time - segment["start_time"] > self.max_segment_seconds:
+                    # Long event: close this part and continue in a new file
+                    try:
+                        self._close_segment(event_id, segment, frame_time)
+                    except WRITER_ERRORS as e:
+                        self._abandon_segment(segment, e)
+                        return False
+                    saved_paths.append(segment["path"])
+                    try:
+                        segment = self._open_segment(event_id, frame_time, segment["part"] + 1)
+                    except WRITER_ERRORS as e:
+                        # Keep the parts already written and end the event there
+                        print(f"Error: {e} Rest of the motion event not recorded.")
+                        segment = None
+                        break
+
+                # Write the frame to the file while recording
+                start = time.perf_counter()
+                try:
+                    segment["writer"].write(frame)
+                except WRITER_ERRORS as e:
+                    self._abandon_segment(segment, e)
+                    return False
+                _write_seconds.observe(time.perf_counter() - start)
+                segment["frame_count"] += 1
+                segment["peak_motion"] = max(segment["peak_motion"], decision.pixels / self.detection_pixels)
+                if face_worker is not None:
+                    # roi_only searches the tiles that fired (and their neighbours) for faces
+                    regions = self.tile_map.regions(decision.fired) if face_worker.roi_only else None
+                    face_worker.submit(frame, thresh, (self.scaler.scale_x, self.scaler.scale_y), copy=True,
+                                       regions=regions)
+
+                # Check if motion has stopped for the timeout duration
+                if frame_time - last_motion_time > self.inactivity_timeout:
+                    print(f"Motion stopped. Finishing recording after {self.inactivity_timeout} seconds of inactivity.")
+                    break # Exit the loop to save the video
+            elif self.pre_roll is not None:
+                self.pre_roll.push(frame, frame_time)
+
+        if is_recording:
+            if segment is not None:
+                try:
+                    self._close_segment(event_id, segment, last_frame_time)
+                except WRITER_ERRORS as e:
+                    self._abandon_segment(segment, e)
+                    return False
+                saved_paths.append(segment["path"])
+            if self.clip_index is not None and face_worker is not None:
+                self.clip_index.set_face_found(event_id, face_worker.finish())
+            self.events_recorded += 1
+            MOTION_EVENTS.inc()
+        print(f"Video saved to {', '.join(saved_paths)}" if is_recording else "No motion was recorded.")
+        return is_recording # Return whether a video was actually created
+
+    def camera_ended(self):
+        """True once the camera stopped delivering frames, as opposed to a stopped or failed recording."""
+        return self.grabber is None or self.grabber.ended()
+
+    def stats(self):
+        """Counters of this recorder, e.g. for a supervisor collecting them from several cameras."""
+        stats = {"events_recorded": self.events_recorded, "frames_captured": 0, "frames_dropped": 0,
+                 "frames_skipped": 0, "backlog": 0}
+        if self.grabber is not None:
+            stats.update(frames_captured=self.grabber.frames_captured, frames_dropped=self.grabber.frames_dropped,
+                         frames_skipped=self.grabber.frames_skipped, backlog=self.grabber.backlog())
+        return stats
+
+    def close(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+            print(f"Captured {self.grabber.frames_captured} frames, dropped {self.grabber.frames_dropped}, "
+                  f"skipped {self.grabber.frames_skipped} while idle.")
+            self.grabber = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
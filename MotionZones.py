@@ -0,0 +1,175 @@
+import json
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from Metrics import stage_timer
+
+_tiles_seconds = stage_timer("tiles")
+
+# detected: whether the frame counts as motion. score: how far the strongest trigger got
+# (1.0 is the threshold). pixels: changed pixels in the computed tiles. fired: boolean
+# (rows, cols) grid of tiles with motion. zones: names of the zones that triggered.
+MotionDecision = namedtuple("MotionDecision", ["detected", "score", "pixels", "fired", "zones"])
+
+
+def load_zones(path):
+    """
+    Reads a zone configuration written as JSON, e.g.
+    {"grid": [16, 12], "zones": [{"name": "plant", "rect": [0.8, 0.0, 1.0, 0.3], "ignore": true}]}.
+    Returns (grid, zones), or (None, None) if the file does not exist.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return None, None
+    grid = tuple(config["grid"]) if "grid" in config else None
+    return grid, config.get("zones", [])
+
+
+class TileMotionMap:
+    """
+    Counts changed pixels per tile of an N x M grid over the motion mask and decides from
+    those counts whether a frame shows motion.
+
+    The counts are two reshape-and-sum reductions per block of tiles, no loop over tiles or
+    pixels. Zones are given as rectangles or polygons in fractions of the frame; a tile
+    belongs to the last zone covering most of it. Tiles of ignore zones are not counted at
+    all, they are simply left out of the blocks that are summed.
+
+    A frame is motion when the weighted changed pixels of all tiles exceed min_motion_pixels,
+    or when a zone with its own min_pixels has more changed pixels than that. A swaying plant
+    can so get a weight of 0.2 while the door triggers on its own at a few hundred pixels.
+
+    Args:
+        scaler (DetectionScaler): Size and scale of the motion mask.
+        min_motion_pixels (int): Weighted changed pixels (at full resolution) that count as motion.
+        grid (tuple): (columns, rows) of the tile grid.
+        zones (list): Dicts with "rect" [x0, y0, x1, y1] or "polygon" [[x, y], ...] in fractions
+            of the frame, and optionally "name", "weight" (default 1.0), "min_pixels" (full
+            resolution) and "ignore".
+        tile_fraction (float): Share of a tile's pixels that must change for the tile to fire.
+
+    The mask rows and columns beyond a whole number of tiles (less than one tile) are not counted.
+    """
+
+    def __init__(self, scaler, min_motion_pixels, grid=(16, 12), zones=None, tile_fraction=0.02):
+        width, height = scaler.size
+        cols, rows = grid
+        self.cols = max(1, min(int(cols), width))
+        self.rows = max(1, min(int(rows), height))
+        self.tile_width = width // self.cols
+        self.tile_height = height // self.rows
+        # Full-frame pixels per tile, for the face search regions
+        self.tile_scale = (self.tile_width * scaler.scale_x, self.tile_height * scaler.scale_y)
+        self.frame_size = scaler.full_size
+        self.min_pixels = scaler.scale_min_pixels(min_motion_pixels)
+        self.tile_min_pixels = max(1, int(self.tile_width * self.tile_height * tile_fraction))
+
+        shape = (self.rows, self.cols)
+        self.weights = np.ones(shape, dtype=np.float32)
+        self.active = np.ones(shape, dtype=bool)
+        # Zones with their own threshold: (name, tile mask, min pixels at detection resolution)
+        self.zone_triggers = []
+        for index, zone in enumerate(zones or []):
+            name = zone.get("name", f"zone{index}")
+            tiles = self._zone_tiles(zone, width, height)
+            if zone.get("ignore"):
+                self.active[tiles] = False
+                continue
+            self.active[tiles] = True
+            self.weights[tiles] = float(zone.get("weight", 1.0))
+            if zone.get("min_pixels") is not None:
+                self.zone_triggers.append((name, tiles, scaler.scale_min_pixels(zone["min_pixels"])))
+        self.weights[~self.active] = 0.0
+        self.zone_triggers = [(name, tiles & self.active, min_pixels) for name, tiles, min_pixels in self.zone_triggers]
+
+        # Tiles that are never summed keep a count of 0
+        self.counts = np.zeros(shape, dtype=np.uint32)
+        self._blocks = self._plan_blocks()
+
+    def _zone_tiles(self, zone, width, height):
+        if "rect" in zone:
+            x0, y0, x1, y1 = zone["rect"]
+            points = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+        elif "polygon" in zone:
+            points = zone["polygon"]
+        else:
+            raise ValueError(f"Zone {zone.get('name', '')!r} needs a 'rect' or a 'polygon'.")
+        # Rasterize the zone at mask resolution, then see how much of each tile it covers
+        mask = np.zeros((self.rows * self.tile_height, self.cols * self.tile_width), dtype=np.uint8)
+        polygon = np.array([(x * width, y * height) for x, y in points], dtype=np.int32)
+        cv2.fillPoly(mask, [polygon], 1)
+        covered = mask.reshape(self.rows, self.tile_height, self.cols, self.tile_width).sum(axis=(1, 3))
+        return covered * 2 >= self.tile_width * self.tile_height
+
+    def _plan_blocks(self):
+        # Splits the active tiles into rectangles: runs of rows with the same active columns,
+        # then runs of active columns. Each block gets its own buffer for the first reduction.
+        blocks = []
+        row = 0
+        while row < self.rows:
+            end = row + 1
+            while end < self.rows and (self.active[end] == self.active[row]).all():
+                end += 1
+            col = 0
+            while col < self.cols:
+                if not self.active[row, col]:
+                    col += 1
+                    continue
+                col_end = col + 1
+                while col_end < self.cols and self.active[row, col_end]:
+                    col_end += 1
+                partial = np.empty((end - row, (col_end - col) * self.tile_width), dtype=np.uint32)
+                blocks.append((row, end, col, col_end, partial))
+                col = col_end
+            row = end
+        return blocks
+
+    def apply(self, mask):
+        """Counts the changed pixels of every active tile and returns the MotionDecision for mask."""
+        start = time.perf_counter()
+        th, tw = self.tile_height, self.tile_width
+        for row, end, col, col_end, partial in self._blocks:
+            block = mask[row * th:end * th, col * tw:col_end * tw]
+            # Sum each tile row's pixel rows first, then the pixels of each tile within that row
+            block.reshape(end - row, th, -1).sum(axis=1, dtype=np.uint32, out=partial)
+            partial.reshape(end - row, col_end - col, tw).sum(axis=2, out=self.counts[row:end, col:col_end])
+        # The mask is 0 or 255
+        counts = self.counts // 255
+        _tiles_seconds.observe(time.perf_counter() - start)
+
+        score = float((counts * self.weights).sum()) / self.min_pixels
+        zones = []
+        for name, tiles, min_pixels in self.zone_triggers:
+            zone_score = float(counts[tiles].sum()) / min_pixels
+            if zone_score > 1.0:
+                zones.append(name)
+            score = max(score, zone_score)
+        fired = (counts >= self.tile_min_pixels) & self.active
+        return MotionDecision(score > 1.0, score, int(counts.sum()), fired, zones)
+
+    def regions(self, fired, padding=1):
+        """
+        Full-frame boxes around the groups of fired tiles, grown by padding tiles on each
+        side, e.g. as regions for the face search.
+        """
+        grid = fired.astype(np.uint8)
+        if padding:
+            size = 2 * padding + 1
+            grid = cv2.dilate(grid, np.ones((size, size), dtype=np.uint8))
+        contours, _ = cv2.findContours(grid, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        scale_x, scale_y = self.tile_scale
+        frame_width, frame_height = self.frame_size
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            x0, y0 = int(x * scale_x), int(y * scale_y)
+            # The last tile also takes the pixels left over at the edge
+            x1 = frame_width if x + w >= self.cols else int((x + w) * scale_x)
+            y1 = frame_height if y + h >= self.rows else int((y + h) * scale_y)
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
@@ -3,11 +3,28 @@ import numpy as np
 import time
 import os
 
-def video_capture(output_path="output.avi", duration=10):
-    cap = cv2.VideoCapture(0)
+from CaptureScheduler import CaptureScheduler
+
+def video_capture(output_path="output.avi", duration=10, source=0, measure_frames=10):
+    cap = cv2.VideoCapture(source)
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_path, fourcc, 20.0, (640, 480))
     start_time = time.time()
+    # Measure the rate the camera really delivers before opening the writer with it
+    frames = []
+    while len(frames) < measure_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    if not frames:
+        cap.release()
+        return
+    elapsed = time.time() - start_time
+    fps = (len(frames) - 1) / elapsed if len(frames) > 1 and elapsed > 0 else (cap.get(cv2.CAP_PROP_FPS) or 20.0)
+    height, width = frames[0].shape[:2]
+    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    for frame in frames:
+        out.write(frame)
     while int(time.time() - start_time) < duration:
         ret, frame = cap.read()
         if not ret:
@@ -16,12 +33,19 @@ def video_capture(output_path="output.avi", duration=10):
     cap.release()
     out.release()
 
-def detect_motion(threshold=30.5, check_interval=1):
-    cap = cv2.VideoCapture(0)
+def detect_motion(threshold=30.5, check_interval=1, source=0):
+    cap = cv2.VideoCapture(source)
     ret, prev_frame = cap.read()
     prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
+    # One frame per check_interval is compared; the ones in between are grabbed undecoded
+    # instead of sleeping, so the compared frame is always the current one
+    scheduler = CaptureScheduler(idle_fps=1.0 / check_interval)
+    scheduler.due(time.time())
     while True:
-        time.sleep(check_interval)
+        if not scheduler.due(time.time()):
+            if not cap.grab():
+                break
+            continue
         ret, frame = cap.read()
         if not ret:
             break
@@ -31,7 +55,7 @@ def detect_motion(threshold=30.5, check_interval=1):
         if non_zero_count > 0:
             print("Motion detected! Starting recording...")
             cap.release()
-            video_capture()
+            video_capture(source=source)
             break
         prev_gray = gray
     cap.release()
@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+
+
+class PreRollBuffer:
+    """
+    Fixed-size ring buffer holding the most recent frames, so a recording can start
+    with the seconds before motion was detected.
+
+    All frames live in one preallocated array of shape (N, H, W, 3), so memory use is
+    constant and known up front (see nbytes).
+
+    Args:
+        seconds (float): How much video to keep before the trigger.
+        fps (float): Expected frame rate, used to turn seconds into a frame count.
+        frame_shape (tuple): Shape of a single frame, e.g. (480, 640, 3).
+    """
+
+    def __init__(self, seconds, fps, frame_shape, dtype=np.uint8):
+        self.capacity = max(1, int(math.ceil(seconds * fps)))
+        self.frames = np.empty((self.capacity,) + tuple(frame_shape), dtype=dtype)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.count = 0
+        self._next = 0
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes + self.timestamps.nbytes
+
+    def push(self, frame, timestamp=0.0):
+        if frame.shape != self.frames.shape[1:]:
+            # A frame of a different size cannot go into the preallocated slots
+            return False
+        np.copyto(self.frames[self._next], frame)
+        self.timestamps[self._next] = timestamp
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def oldest_timestamp(self):
+        """Timestamp of the oldest buffered frame, or None when empty."""
+        if self.count == 0:
+            return None
+        return float(self.timestamps[(self._next - self.count) % self.capacity])
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Yields the buffered frames from oldest to newest."""
+        start = (self._next - self.count) % self.capacity
+        for i in range(self.count):
+            yield self.frames[(start + i) % self.capacity]
+
+    def drain(self, writer, copy=False, fps=None, since=None, until=None):
+        """
+        Writes all buffered frames to writer (oldest first) and empties the buffer.
+        Use copy=True for writers that keep the frame after write() returns, since the
+        buffer slots are reused.
+
+        Frames older than since are skipped. With fps, a frame is repeated until the next
+        one (or until, for the newest) is due, so frames sampled at a low idle rate still
+        play back in real time. Returns the number of frames written.
+        """
+        start = (self._next - self.count) % self.capacity
+        slots = [(start + i) % self.capacity for i in range(self.count)]
+        if since is not None:
+            slots = [slot for slot in slots if self.timestamps[slot] >= since]
+        written = 0
+        for i, slot in enumerate(slots):
+            next_time = self.timestamps[slots[i + 1]] if i + 1 < len(slots) else until
+            repeats = 1
+            if fps is not None and next_time is not None:
+                repeats = max(1, int(round((next_time - self.timestamps[slot]) * fps)))
+            frame = self.frames[slot].copy() if copy else self.frames[slot]
+            for _ in range(repeats):
+                writer.write(frame)
+            written += repeats
+        self.clear()
+        return written
+
+    def clear(self):
+        self.count = 0
+        self._next = 0
@@ -0,0 +1,57 @@
+"""
+SMTP stub shared by Benchmark.py and test_MailSessionPool.py. Standard library only, so
+the mail tests don't need OpenCV.
+"""
+
+import socketserver
+import threading
+
+
+class SmtpStub(socketserver.ThreadingTCPServer):
+    """
+    Minimal local SMTP server that accepts and discards every message, so the mail path
+    can be measured and tested without a network or an account. No STARTTLS and no login.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _SmtpStubHandler)
+        self.messages_received = 0
+        self.port = self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SmtpStubHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.reply("220 localhost benchmark stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-localhost\r\n250-SIZE 52428800\r\n250 8BITMIME\r\n")
+            elif command.startswith("DATA"):
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.messages_received += 1
+                self.reply("250 OK")
+            elif command.startswith("QUIT"):
+                self.reply("221 Bye")
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply("250 OK")
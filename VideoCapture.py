@@ -1,7 +1,8 @@
 import cv2
 import time
+from AsyncVideoWriter import AsyncVideoWriter
 
-def record_video(duration_seconds=10, output_filename="recording.avi"):
+def record_video(duration_seconds=10, output_filename="recording.avi", source=0):
     """
     Accesses the default camera, records video for a specified duration,
     and saves it to a file.
@@ -9,12 +10,13 @@ def record_video(duration_seconds=10, output_filename="recording.avi"):
     Args:
         duration_seconds (int): The duration of the recording in seconds.
         output_filename (str): The name of the output video file.
+        source (int or str): Camera index, video file or stream URL.
     """
     # --- 1. SETUP ---
     
-    # Select the default camera (usually index 0)
-    # If you have multiple cameras, you might need to change this to 1, 2, etc.
-    cap = cv2.VideoCapture(0)
+    # The default camera is index 0
+    # If you have multiple cameras, pass 1, 2, etc. (or a stream URL) as source
+    cap = cv2.VideoCapture(source)
 
     # Check if the camera opened successfully
     if not cap.isOpened():
@@ -33,8 +35,9 @@ def record_video(duration_seconds=10, output_filename="recording.avi"):
 
     # Define the codec and create a VideoWriter object
     # The 'XVID' codec is a good choice for AVI files.
+    # Encoding runs on its own thread so it doesn't slow down the capture loop.
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_filename, fourcc, fps, (frame_width, frame_height))
+    out = AsyncVideoWriter(output_filename, fourcc, fps, (frame_width, frame_height))
 
     print(f"Recording for {duration_seconds} seconds... Press 'q' to stop early.")
     print(f"Video will be saved as '{output_filename}'")
@@ -67,8 +70,10 @@ def record_video(duration_seconds=10, output_filename="recording.avi"):
     print("Recording complete.")
     
     # Release the video capture and video write objects
+    # (release() waits until the queued frames are encoded)
     cap.release()
     out.release()
+    print(f"Encoded at {out.encode_fps():.1f} fps, max backlog {out.max_backlog} frames.")
 
     # Close all OpenCV windows
     cv2.destroyAllWindows()
@@ -1,8 +1,9 @@
 import cv2
 import numpy as np
-import time
 from dotenv import load_dotenv
 import os
+from FrameGrabber import FrameGrabber
+from FaceDetection import get_detector_pool
 
 load_dotenv(dotenv_path=r"C:\Users\esma-\dev\CameraDetection\infos.env")
 # Read values from environment variables
@@ -11,7 +12,8 @@ PASSWORD = os.getenv("PASSWORD")
 TO_EMAIL = os.getenv("TO_EMAIL")
 
 
-def record_on_motion(output_path="output.avi", threshold=30, min_motion_pixels=10000, inactivity_timeout=5.0):
+def record_on_motion(output_path="output.avi", threshold=30, min_motion_pixels=10000, inactivity_timeout=5.0,
+                     queue_size=32, drop_policy="drop_oldest"):
  
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
@@ -36,8 +38,11 @@ def record_on_motion(output_path="output.avi", threshold=30, min_motion_pixels=1
 
     print("Ready to detect motion. Press 'q' to quit.")
 
+    # Frames are read on a separate thread so slow processing or disk writes don't stall the camera
+    grabber = FrameGrabber(cap, max_queue=queue_size, drop_policy=drop_policy).start()
+
     while True:
-        ret, frame = cap.read()
+        ret, frame, frame_time = grabber.read()
         if not ret:
             break
 
@@ -60,22 +65,24 @@ def record_on_motion(output_path="output.avi", threshold=30, min_motion_pixels=1
                 is_recording = True
                 out = cv2.VideoWriter(output_path, fourcc, 20.0, (width, height))
             
-            last_motion_time = time.time()
+            last_motion_time = frame_time
 
         if is_recording:
             # Write the frame to the file while recording
             out.write(frame)
 
             # Check if motion has stopped for the timeout duration
-            if time.time() - last_motion_time > inactivity_timeout:
+            if frame_time - last_motion_time > inactivity_timeout:
                 print(f"Motion stopped. Finishing recording after {inactivity_timeout} seconds of inactivity.")
                 break # Exit the loop to save the video
 
         prev_gray = gray
     # Cleanup
+    grabber.stop()
     if is_recording:
         out.release()
     cap.release()
+    print(f"Captured {grabber.frames_captured} frames, dropped {grabber.frames_dropped}.")
     cv2.destroyAllWindows()
     print(f"Video saved to {output_path}" if is_recording else "No motion was recorded.")
     return is_recording # Return whether a video was actually created
@@ -99,7 +106,7 @@ def capture_frame_from_video(video_path='output.avi', output_image='face.jpg'):
 
 def faceDetect():
     # Load the pre-trained Haar Cascade face detector
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    face_cascade = get_detector_pool().get()
 
     # Open the video file
     cap = cv2.VideoCapture(r"C:\Users\esma-\dev\CameraDetection\output.avi")
@@ -0,0 +1,90 @@
+"""
+Checks MailSessionPool against the local SMTP stub, no network needed.
+
+    python -m unittest test_MailSessionPool
+"""
+
+import socket
+import unittest
+from email.message import EmailMessage
+
+from MailSessionPool import MailSessionPool
+from SmtpStub import SmtpStub
+
+
+class DroppingSmtpStub(SmtpStub):
+    """SmtpStub that can close its client connections, like a server timing out idle sessions."""
+
+    def __init__(self, port=0):
+        super().__init__(port)
+        self.connections = []
+
+    def process_request(self, request, client_address):
+        self.connections.append(request)
+        super().process_request(request, client_address)
+
+    def drop_connections(self):
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.connections = []
+
+
+def _message(number):
+    msg = EmailMessage()
+    msg["Subject"] = f"Test {number}"
+    msg["From"] = "camera@localhost"
+    msg["To"] = "owner@localhost"
+    msg.set_content("Test message")
+    return msg
+
+
+class MailSessionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = DroppingSmtpStub().start()
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        self.server.stop()
+
+    def pool(self, **options):
+        pool = MailSessionPool("127.0.0.1", self.server.port, "camera@localhost", "", use_tls=False,
+                               timeout=5.0, **options)
+        self.pools.append(pool)
+        return pool
+
+    def test_session_is_reused(self):
+        pool = self.pool()
+        for number in range(3):
+            pool.send_message(_message(number))
+        self.assertEqual(pool.connects, 1)
+        self.assertEqual(pool.messages_sent, 3)
+        self.assertEqual(self.server.messages_received, 3)
+
+    def test_noop_detects_dropped_session(self):
+        # Every reuse is checked with NOOP; the dead session is replaced before sending
+        pool = self.pool(noop_after=0.0)
+        pool.send_message(_message(1))
+        self.server.drop_connections()
+        pool.send_message(_message(2))
+        self.assertEqual(pool.connects, 2)
+        self.assertEqual(self.server.messages_received, 2)
+
+    def test_failed_send_is_retried(self):
+        # No NOOP check, so the send itself hits the dropped connection and is retried
+        pool = self.pool(noop_after=3600.0)
+        pool.send_message(_message(1))
+        self.server.drop_connections()
+        pool.send_message(_message(2))
+        self.assertEqual(pool.connects, 2)
+        self.assertEqual(pool.messages_sent, 2)
+        self.assertEqual(self.server.messages_received, 2)
+        self.assertEqual(pool.stats()["open_sessions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Records motion events from a generated clip with MotionRecorder, no camera needed.
+
+    python -m unittest test_MotionRecorder
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from AsyncVideoWriter import AsyncVideoWriter
+from ClipIndex import ClipIndex
+from MotionRecorder import MotionRecorder
+
+
+def _write_clip(path, size=(320, 240), frames=40, fps=20.0):
+    # A still scene with a bright square moving across it from the middle of the clip on
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frames):
+        frame = np.full((height, width, 3), 40, dtype=np.uint8)
+        if i >= frames // 2:
+            x = (i - frames // 2) * 8
+            frame[60:180, x:x + 120] = 255
+        writer.write(frame)
+    writer.release()
+
+
+class _FailingWriter:
+    # Opens fine, then fails like an encoder on a full disk
+    def isOpened(self):
+        return True
+
+    def write(self, frame):
+        raise OSError("No space left on device")
+
+    def release(self):
+        pass
+
+
+class MotionRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.clip = os.path.join(self.dir, "clip.avi")
+        _write_clip(self.clip)
+        self.clip_index = ClipIndex(":memory:")
+        self.recorders = []
+
+    def tearDown(self):
+        for recorder in self.recorders:
+            recorder.close()
+        self.clip_index.close()
+        shutil.rmtree(self.dir)
+
+    def recorder(self, output_path, **options):
+        recorder = MotionRecorder(source=self.clip, output_path=output_path, min_motion_pixels=2000,
+                                  inactivity_timeout=0.2, drop_policy="block", pre_roll_seconds=0,
+                                  clip_index=self.clip_index, idle_fps=None, **options)
+        self.recorders.append(recorder)
+        self.assertTrue(recorder.open())
+        return recorder
+
+    def test_event_is_recorded_and_indexed(self):
+        output = os.path.join(self.dir, "event.avi")
+        recorder = self.recorder(output)
+        self.assertTrue(recorder.record_event())
+        self.assertTrue(os.path.exists(output))
+        self.assertEqual([clip["path"] for clip in self.clip_index.clips()], [output])
+
+    def test_unopenable_writer_is_not_indexed(self):
+        # The folder does not exist, so the writer can't create the file
+        output = os.path.join(self.dir, "missing", "event.avi")
+        for async_writer in (True, False):
+            with self.subTest(async_writer=async_writer):
+                recorder = self.recorder(output, async_writer=async_writer)
+                self.assertFalse(recorder.record_event())
+                self.assertEqual(recorder.events_recorded, 0)
+                self.assertFalse(os.path.exists(output))
+                self.assertEqual(self.clip_index.clips(), [])
+
+    def test_encoder_error_ends_event_without_index(self):
+        recorder = self.recorder(os.path.join(self.dir, "event.avi"))
+
+        def create_writer(path, fps):
+            writer = AsyncVideoWriter(path, recorder.fourcc, fps, (recorder.width, recorder.height), copy=True)
+            writer.writer = _FailingWriter()
+            return writer
+
+        recorder._create_writer = create_writer
+        self.assertFalse(recorder.record_event())
+        self.assertFalse(recorder.camera_ended())
+        self.assertEqual(self.clip_index.clips(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()